@@ -1,9 +1,15 @@
 import argparse
 import sys
+
+import ujson
+
 from rem.logger import log
 
 from rem.config import settings
 from rem.otodom import Otodom
+from rem.replay import replay
+from rem.storage import resolve_data_format
+from rem.utils import save_data
 
 
 # setup argparser with: propertytype, rentaltype, city, savephotos
@@ -13,8 +19,13 @@ def parse_args(args):
     parser = argparse.ArgumentParser(description='Provide input scrapper args')
 
     # @TODO: Add url validator
-    parser.add_argument(
-        '--url', nargs="?", required=True, help='Enter otodom search url'
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--url', nargs="?", help='Enter otodom search url')
+    mode.add_argument(
+        '--replay',
+        nargs="?",
+        type=str,
+        help='Extract data from saved HTMLs (archive or directory) offline',
     )
     parser.add_argument(
         '--page_limit',
@@ -63,12 +74,64 @@ def parse_args(args):
         type=float,
         help='Offset between queries',
     )
+    parser.add_argument(
+        '--requests_per_second',
+        nargs="?",
+        required=False,
+        type=float,
+        help='Maximum rate of requests sent to a single host',
+    )
+    parser.add_argument(
+        '--concurrent_requests',
+        nargs="?",
+        required=False,
+        type=int,
+        help='Number of listing pages fetched concurrently',
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted crawl of the url where it stopped, '
+        'needs the data file name of the crawl',
+    )
+    parser.add_argument(
+        '--jsonl',
+        action='store_true',
+        help='Write the listings to stdout as JSON lines while scraping',
+    )
+    parser.add_argument(
+        '--workers',
+        nargs="?",
+        required=False,
+        type=int,
+        help='Number of processes used by --replay, all cores by default',
+    )
 
-    return parser.parse_args(args)
+    parsed = parser.parse_args(args)
+    # The data and the checkpoint of a crawl are found by the data file
+    # name, by default a new timestamp on every run
+    if (
+        parsed.resume
+        and not parsed.data_file_name
+        and "DATA_FILE_NAME" not in settings.__fields_set__
+    ):
+        parser.error("--resume requires --data_file_name or DATA_FILE_NAME")
+    return parsed
 
 
 def main():
     args = parse_args(sys.argv[1:])
+
+    if args.replay:
+        data = replay(args.replay, workers=args.workers)
+        save_data(
+            data,
+            args.data_file_name or f"{settings.DATA_FILE_NAME}_replay",
+            args.data_directory,
+            resolve_data_format(settings.DATA_FORMAT),
+        )
+        return
+
     log.info(f"Starting scrapping of {args.url}...")
 
     settings.BASE_SEARCH_URL = args.url
@@ -77,9 +140,26 @@ def main():
         settings.PAGE_LIMIT = args.page_limit
     if args.offset:
         settings.OFFSET = args.offset
+    # Only the options given override the settings, whatever their value
+    if args.requests_per_second is not None:
+        settings.REQUESTS_PER_SECOND = args.requests_per_second
+    if args.concurrent_requests is not None:
+        settings.CONCURRENT_REQUESTS = args.concurrent_requests
+    if args.data_file_name:
+        settings.DATA_FILE_NAME = args.data_file_name
+    if args.resume:
+        settings.RESUME = True
 
     log.info(f"Config set to: {settings}")
     scraper = Otodom()
+    if args.jsonl:
+        for record in scraper.iter_listings():
+            line = ujson.dumps(
+                record, ensure_ascii=False, escape_forward_slashes=False
+            )
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+        return
     data, statistics = scraper.scrap()
 
 
@@ -0,0 +1,175 @@
+import datetime
+import mmap
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from rem.cache import compress, decompress
+
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+class HtmlArchive:
+    """
+    Append-only archive of downloaded pages. Every page is compressed on its
+    own and appended to the current segment file (`segment-00000.bin`, ...),
+    a new segment is started once the current one grows past
+    `segment_size` bytes. An SQLite index maps (url, fetched_at) to the
+    segment, offset and length of the page, reads go through a memory map of
+    the segment, so a page is fetched without reading anything else.
+
+    The same url can be archived many times, `read` returns the newest copy
+    (or the newest one fetched before `at`).
+    """
+
+    def __init__(self, directory: str, segment_size: int = SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._index = sqlite3.connect(
+            os.sep.join([self.directory, "index.sqlite"]),
+            check_same_thread=False,
+        )
+        with self._index:
+            self._index.execute(
+                "CREATE TABLE IF NOT EXISTS pages (url TEXT, fetched_at TEXT, "
+                "segment INTEGER, offset INTEGER, length INTEGER, codec TEXT)"
+            )
+            self._index.execute(
+                "CREATE INDEX IF NOT EXISTS pages_url "
+                "ON pages (url, fetched_at)"
+            )
+        last_segment = self._index.execute(
+            "SELECT MAX(segment) FROM pages"
+        ).fetchone()[0]
+        self._segment = last_segment or 0
+
+    def segment_path(self, segment: int) -> str:
+        return os.sep.join([self.directory, f"segment-{segment:05d}.bin"])
+
+    def write(
+        self,
+        url: str,
+        html: str,
+        fetched_at: Optional[datetime.datetime] = None,
+    ) -> None:
+        fetched_at = fetched_at or datetime.datetime.now()
+        codec, data = compress(html.encode("utf-8"))
+
+        with self._lock:
+            path = self.segment_path(self._segment)
+            if (
+                os.path.isfile(path)
+                and os.path.getsize(path) + len(data) > self.segment_size
+            ):
+                self._segment += 1
+                path = self.segment_path(self._segment)
+
+            with open(path, "ab") as segment:
+                offset = segment.tell()
+                segment.write(data)
+
+            # The page is on disk before it is indexed, a crash in between
+            # only leaves unreferenced bytes behind
+            with self._index:
+                self._index.execute(
+                    "INSERT INTO pages VALUES (?,?,?,?,?,?)",
+                    (
+                        url,
+                        fetched_at.isoformat(),
+                        self._segment,
+                        offset,
+                        len(data),
+                        codec,
+                    ),
+                )
+
+    def read(
+        self, url: str, at: Optional[datetime.datetime] = None
+    ) -> Optional[str]:
+        query = "SELECT segment, offset, length, codec FROM pages WHERE url=?"
+        parameters: Tuple = (url,)
+        if at:
+            query += " AND fetched_at <= ?"
+            parameters += (at.isoformat(),)
+        query += " ORDER BY fetched_at DESC LIMIT 1"
+
+        with self._lock:
+            row = self._index.execute(query, parameters).fetchone()
+            if not row:
+                return None
+            return self._read_page(*row)
+
+    def __iter__(self) -> Iterator[Tuple[str, datetime.datetime, str]]:
+        """
+        Every archived page as (url, fetched_at, html), in the order they
+        were written, so the segments are read sequentially.
+        """
+        with self._lock:
+            rows = self._index.execute(
+                "SELECT url, fetched_at, segment, offset, length, codec "
+                "FROM pages ORDER BY segment, offset"
+            ).fetchall()
+
+        for url, fetched_at, *location in rows:
+            with self._lock:
+                html = self._read_page(*location)
+            yield url, datetime.datetime.fromisoformat(fetched_at), html
+
+    def latest(self) -> Iterator[Tuple[str, datetime.datetime, str]]:
+        """Like iterating the archive, but only the newest copy of each url."""
+        with self._lock:
+            rows = self._index.execute(
+                "SELECT url, fetched_at, segment, offset, length, codec "
+                "FROM pages JOIN (SELECT url, MAX(fetched_at) AS fetched_at "
+                "FROM pages GROUP BY url) USING (url, fetched_at) "
+                "ORDER BY segment, offset"
+            ).fetchall()
+
+        for url, fetched_at, *location in rows:
+            with self._lock:
+                html = self._read_page(*location)
+            yield url, datetime.datetime.fromisoformat(fetched_at), html
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return bool(
+                self._index.execute(
+                    "SELECT 1 FROM pages WHERE url=? LIMIT 1", (url,)
+                ).fetchone()
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._index.execute(
+                "SELECT COUNT(*) FROM pages"
+            ).fetchone()[0]
+
+    def _read_page(
+        self, segment: int, offset: int, length: int, codec: str
+    ) -> str:
+        segment_map = self._maps.get(segment)
+        # The current segment keeps growing, remap it when the page was
+        # written after it was mapped
+        if segment_map is None or offset + length > len(segment_map):
+            if segment_map is not None:
+                segment_map.close()
+            with open(self.segment_path(segment), "rb") as segment_file:
+                segment_map = mmap.mmap(
+                    segment_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            self._maps[segment] = segment_map
+
+        data = segment_map[offset : offset + length]
+        return decompress(codec, data).decode("utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            for segment_map in self._maps.values():
+                segment_map.close()
+            self._maps = {}
+            self._index.close()
@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Mapping
+
+import numpy as np
+import pandas as pd
+
+from rem.columns import COLUMN_TYPES
+
+
+class RowBuffer:
+    """
+    Accumulates records column by column and turns them into a DataFrame in
+    one go, instead of copying the whole frame for every appended row.
+    Columns keep the order they first appeared in, a record without some
+    of the columns leaves NaN there, as `DataFrame.append` did. Columns of
+    `rem.columns` get their declared types when the rows are materialised,
+    numbers as floats since they can be missing, the types of the other
+    columns are inferred.
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, List[Any]] = {}
+        self._length = 0
+
+    def append(self, record: Mapping[str, Any]) -> None:
+        for name, value in record.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = [np.nan] * self._length
+                self.columns[name] = column
+            column.append(value)
+        self._length += 1
+        for column in self.columns.values():
+            if len(column) < self._length:
+                column.append(np.nan)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def to_frame(self) -> pd.DataFrame:
+        data = pd.DataFrame(self.columns, dtype=object).infer_objects()
+        # A batch without a single price still has a numeric price column
+        return data.astype(
+            {
+                name: object if COLUMN_TYPES[name] is str else float
+                for name in data.columns
+                if name in COLUMN_TYPES
+            }
+        )
+
+    def flush_into(self, data: pd.DataFrame) -> pd.DataFrame:
+        """`data` with the buffered rows appended, the buffer is emptied."""
+        if not self._length:
+            return data
+        rows = self.to_frame()
+        self.columns = {}
+        self._length = 0
+        if data.empty and not len(data.columns):
+            return rows
+        return pd.concat([data, rows], ignore_index=True)
@@ -0,0 +1,197 @@
+import hashlib
+import time
+import zlib
+from typing import Optional, Tuple
+
+from requests_cache import CachedSession
+from requests_cache.backends.base import BaseCache
+from requests_cache.backends.sqlite import SQLiteCache, SQLiteDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EVICTION_BATCH_SIZE = 100
+
+
+def compress(body: bytes) -> Tuple[str, bytes]:
+    if zstandard:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(body)
+    return "zlib", zlib.compress(body, 6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if not zstandard:
+            raise KeyError("zstandard is needed to read this cache entry")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class ContentAddressedDict(SQLiteDict):
+    """
+    SQLite response storage keeping response bodies compressed in a separate
+    table keyed by their sha256, so identical bodies are stored once. Reads
+    update an access time, and once the database grows past `max_size`
+    bytes the least recently used responses are evicted.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        table_name: str = "compressed_responses",
+        max_size: Optional[int] = None,
+        **kwargs,
+    ):
+        self.max_size = max_size
+        super().__init__(db_path, table_name=table_name, **kwargs)
+
+    @property
+    def bodies_table_name(self) -> str:
+        return f"{self.table_name}_bodies"
+
+    def init_db(self):
+        self.close()
+        with self._lock, self.connection(commit=True) as con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table_name} "
+                f"(key PRIMARY KEY, value, body_hash, accessed REAL)"
+            )
+            con.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table_name}_accessed "
+                f"ON {self.table_name} (accessed)"
+            )
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.bodies_table_name} "
+                f"(hash PRIMARY KEY, codec, body)"
+            )
+
+    def __getitem__(self, key):
+        with self.connection(commit=True) as con:
+            row = con.execute(
+                f"SELECT value, codec, body FROM {self.table_name} "
+                f"JOIN {self.bodies_table_name} ON body_hash = hash "
+                f"WHERE key=?",
+                (key,),
+            ).fetchone()
+            if row:
+                con.execute(
+                    f"UPDATE {self.table_name} SET accessed=? WHERE key=?",
+                    (time.time(), key),
+                )
+        # raise error after the with block, otherwise the connection will be
+        # locked
+        if not row:
+            raise KeyError
+
+        value, codec, compressed_body = row
+        response = self.serializer.loads(value)
+        body = decompress(codec, compressed_body)
+        response._content = body
+        response.raw.reset(body)
+        return response
+
+    def __setitem__(self, key, value):
+        body = value._content or b""
+        body_hash = hashlib.sha256(body).hexdigest()
+
+        # The body is stored separately, serialise the rest of the response
+        value._content = None
+        try:
+            serialized_value = self.serializer.dumps(value)
+        finally:
+            value._content = body
+
+        with self.connection(commit=True) as con:
+            stored = con.execute(
+                f"SELECT 1 FROM {self.bodies_table_name} WHERE hash=?",
+                (body_hash,),
+            ).fetchone()
+            if not stored:
+                codec, compressed_body = compress(body)
+                con.execute(
+                    f"INSERT OR IGNORE INTO {self.bodies_table_name} "
+                    f"(hash, codec, body) VALUES (?,?,?)",
+                    (body_hash, codec, compressed_body),
+                )
+            con.execute(
+                f"INSERT OR REPLACE INTO {self.table_name} "
+                f"(key, value, body_hash, accessed) VALUES (?,?,?,?)",
+                (key, serialized_value, body_hash, time.time()),
+            )
+
+        if self.max_size:
+            self.evict()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.remove_orphaned_bodies()
+
+    def bulk_delete(self, keys=None, values=None):
+        super().bulk_delete(keys=keys, values=values)
+        self.remove_orphaned_bodies()
+
+    def clear(self):
+        with self._lock:
+            with self.connection(commit=True) as con:
+                con.execute(f"DROP TABLE IF EXISTS {self.bodies_table_name}")
+            super().clear()
+
+    def remove_orphaned_bodies(self):
+        with self.connection(commit=True) as con:
+            con.execute(
+                f"DELETE FROM {self.bodies_table_name} WHERE hash NOT IN "
+                f"(SELECT body_hash FROM {self.table_name})"
+            )
+
+    def size(self) -> int:
+        """Bytes used by the database, not counting free pages."""
+        with self.connection() as con:
+            page_size = con.execute("PRAGMA page_size").fetchone()[0]
+            page_count = con.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = con.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def evict(self):
+        while self.size() > self.max_size:
+            with self.connection(commit=True) as con:
+                evicted = con.execute(
+                    f"DELETE FROM {self.table_name} WHERE key IN "
+                    f"(SELECT key FROM {self.table_name} "
+                    f"ORDER BY accessed LIMIT ?)",
+                    (EVICTION_BATCH_SIZE,),
+                ).rowcount
+            self.remove_orphaned_bodies()
+            if not evicted:
+                return
+
+
+class CompressedCache(SQLiteCache):
+    """
+    SQLite cache backend with compressed, deduplicated bodies and an optional
+    size cap (in bytes) enforced by LRU eviction.
+    """
+
+    def __init__(
+        self, db_path="http_cache", max_size: Optional[int] = None, **kwargs
+    ):
+        BaseCache.__init__(self, **kwargs)
+        self.responses = ContentAddressedDict(
+            db_path, max_size=max_size, **kwargs
+        )
+        self.redirects = SQLiteDict(db_path, table_name="redirects", **kwargs)
+
+
+def get_compressed_session(
+    cache_name: str, max_size: Optional[int] = None, **kwargs
+) -> CachedSession:
+    """
+    CachedSession backed by `CompressedCache`; can be passed as the `session`
+    of `Otodom`.
+    """
+    return CachedSession(
+        cache_name,
+        backend=CompressedCache(cache_name, max_size=max_size),
+        **kwargs,
+    )
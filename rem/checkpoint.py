@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+from typing import Dict, IO, Iterable, List, Optional, Set, Tuple
+
+from rem.logger import log
+from rem.seen import SeenListings
+
+
+class CrawlCheckpoint:
+    """
+    Journal of the progress of a crawl, so an interrupted crawl can be
+    resumed. Every search page is recorded along with its listing urls once
+    fetched, then the listings as their rows are saved, then the page once
+    finished. It's a JSON-lines file written with an fsync per entry, an
+    entry torn by a crash is dropped when it is read back.
+
+    With `resume`, the journal of the previous crawl is read: finished pages
+    are skipped and unfinished ones are continued from their listings that
+    weren't saved yet, without fetching the search page again. Otherwise it
+    is started over.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.finished_pages: Set[str] = set()
+        # Pages in progress, with their listing urls and metadata
+        self.pages: Dict[str, Tuple[List[str], Dict[str, int]]] = {}
+        self.saved_listings = SeenListings()
+        self._lock = threading.Lock()
+        self._journal: Optional[IO[str]] = None
+        # The journal of a crawl started over is only replaced once written
+        self._journal_mode = "a" if resume else "w"
+
+        if resume and os.path.isfile(path):
+            self._load()
+            log.info(
+                f"Resuming the crawl after {len(self.finished_pages)} search "
+                f"pages and {len(self.saved_listings)} listings"
+            )
+        elif resume:
+            log.warning(f"No checkpoint found in {path}, starting over")
+
+    def _load(self) -> None:
+        with open(self.path, "rb+") as f:
+            lines = f.read().split(b"\n")
+            # An entry torn by a crash is the last, unterminated line, it's
+            # dropped so the next entry starts on a line of its own
+            if lines[-1]:
+                log.warning(f"Dropping a torn entry of {self.path}")
+                f.truncate(f.tell() - len(lines[-1]))
+
+        for line in lines[:-1]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                log.warning(f"Skipping an invalid entry of {self.path}")
+                continue
+            if "page" in entry:
+                self.pages[entry["page"]] = (
+                    entry["listings"],
+                    entry["metadata"],
+                )
+            elif "saved" in entry:
+                self.saved_listings.add_many(entry["saved"])
+            elif "finished" in entry:
+                self.pages.pop(entry["finished"], None)
+                self.finished_pages.add(entry["finished"])
+
+    def _write(self, entry: Dict) -> None:
+        with self._lock:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._journal = open(
+                    self.path, self._journal_mode, encoding="utf-8"
+                )
+                self._journal_mode = "a"
+            self._journal.write(json.dumps(entry) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def start_page(
+        self, url: str, listing_urls: List[str], metadata: Dict[str, int]
+    ) -> None:
+        self._write(
+            {"page": url, "listings": listing_urls, "metadata": metadata}
+        )
+
+    def save_listings(self, urls: Iterable[str]) -> None:
+        urls = list(urls)
+        if urls:
+            self._write({"saved": urls})
+
+    def finish_page(self, url: str) -> None:
+        self._write({"finished": url})
+
+    def is_finished(self, url: str) -> bool:
+        """Whether there is nothing left to do for the page at `url`."""
+        if url in self.finished_pages:
+            return True
+        resumed_page = self.resumed_page(url)
+        return resumed_page is not None and not resumed_page[0]
+
+    def resumed_page(
+        self, url: str
+    ) -> Optional[Tuple[List[str], Dict[str, int]]]:
+        """
+        Listing urls of the unfinished page at `url` that weren't saved, and
+        the metadata of the page, or None if it wasn't started.
+        """
+        if url not in self.pages:
+            return None
+        listing_urls, metadata = self.pages[url]
+        return [
+            listing_url
+            for listing_url in listing_urls
+            if listing_url not in self.saved_listings
+        ], metadata
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def clear(self) -> None:
+        """Drop the journal of a crawl that finished."""
+        self.close()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,58 @@
+from typing import Dict
+
+# Type of the values of every column of the data, so files are written with
+# the same column types whatever values a batch of rows happens to have.
+# Missing values of the numeric columns are NaN in a DataFrame, so they are
+# floats there, except `unique_id` which is always a whole number
+
+# Columns filled by the listing extractors, in the order they run. The
+# columns of a failed extractor are left None
+LISTING_COLUMN_TYPES: Dict[str, type] = {
+    "created_at": str,
+    "url": str,
+    "price": float,
+    "floor_size_in_m2": float,
+    "building_type": str,
+    "windows_type": str,
+    "year_of_construction": float,
+    "number_of_rooms": float,
+    "condition": str,
+    "floor": float,
+    "floors_in_building": float,
+    "monthly_fee": float,
+    "unique_id": int,
+    "ownership_form": str,
+    "construction_material": str,
+    "market_type": str,
+    "heating": str,
+    "address": str,
+    "ad_description": str,
+    "air_conditioning": float,
+    "basement": float,
+    "elevator": float,
+    "balcony": float,
+    "garden": float,
+    "terrace": float,
+    "parking": float,
+    "garage": float,
+    "amenities": float,
+}
+LISTING_COLUMNS = tuple(LISTING_COLUMN_TYPES)
+
+# Columns filled from the Google Maps API, distances and times as the
+# texts it returns, e.g. "12 km"
+GCP_COLUMN_TYPES: Dict[str, type] = {
+    "latitude": float,
+    "longitude": float,
+    "distance_to center": str,
+    "commuting_time_min": str,
+    "driving_distance_to center": str,
+    "driving_commuting_time_min": str,
+    "bicycling_distance_to center": str,
+    "bicycling_commuting_time_min": str,
+    "walking_distance_to center": str,
+    "walking_commuting_time_min": str,
+}
+GCP_COLUMNS = tuple(GCP_COLUMN_TYPES)
+
+COLUMN_TYPES: Dict[str, type] = {**LISTING_COLUMN_TYPES, **GCP_COLUMN_TYPES}
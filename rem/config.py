@@ -79,8 +79,53 @@ class Settings(BaseSettings):
     DESTINATION: str
     TIMEOUT: int = 0
     LOAD_FROM_DATA: bool = True
+    # Continue the interrupted crawl of BASE_SEARCH_URL from its checkpoint
+    # in the data directory, set by `main.py --resume`
+    RESUME: bool = False
     SAVE_HTMLS: bool = False
+    # "archive" (compressed segments with an index) or "files" (one per page)
+    SAVE_HTMLS_FORMAT: str = "archive"
+    # Any BeautifulSoup tree builder: "html.parser", "lxml" or "html5lib"
+    HTML_PARSER: str = "html.parser"
+    # Extract listings in a single streaming pass, without building a tree
+    STREAMING_EXTRACTION: bool = False
+    # Read listings from the page state embedded in the HTML, the page is
+    # only parsed for what the state lacks
+    EMBEDDED_STATE_EXTRACTION: bool = False
     USE_CACHE: bool = True
+    CACHE_BACKEND: str = "sqlite"
+    CACHE_MAX_SIZE: Optional[int] = None
+    CONCURRENT_REQUESTS: int = 1
+    # Processes parsing and extracting the listings, 0 parses them in the
+    # main process
+    PARSE_WORKERS: int = 0
+    # Reuse the record of a listing page unchanged since it was extracted
+    EXTRACTION_CACHE: bool = False
+    # New listings are added to the data in batches of at most this many
+    # rows, and at the end of every search page
+    ROW_BUFFER_SIZE: int = 1000
+    # "csv", "parquet" (typed and compressed, needs pyarrow) or "sqlite"
+    # (listings upserted by unique_id, see `rem.store.ListingStore`)
+    DATA_FORMAT: str = "csv"
+    # Keep the changes of every saved listing over time, see
+    # `rem.history.ListingHistory`
+    SAVE_HISTORY: bool = False
+    REQUESTS_PER_SECOND: float = 0
+    REQUESTS_BURST: int = 1
+    RATE_LIMIT_STATE_FILE: Optional[str] = os.sep.join(
+        [".cache", "rate_limit.json"]
+    )
+    ADAPTIVE_RATE: bool = False
+    MIN_REQUESTS_PER_SECOND: float = 0.2
+    MAX_REQUESTS_PER_SECOND: float = 5
+    TARGET_LATENCY: float = 2
+    MAX_RETRIES: int = 0
+    # Seconds before the first retry, doubled for every next one, unless
+    # the response says how long to wait (Retry-After)
+    RETRY_BACKOFF: float = 1
+    SEARCH_PAGE_PREFETCH: int = 0
+    REVALIDATE_LISTINGS_AFTER: int = -1
+    SEARCH_PAGE_MAX_STALENESS: int = 0
 
     class Config:
         env_file = ".env"
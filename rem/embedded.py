@@ -0,0 +1,156 @@
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+import ujson
+
+from rem.streaming import INDEXED_TAGS, StreamedElement
+from rem.utils import ListingIndex, get_listing_index, get_soup
+
+# Listing pages are rendered by Next.js, which embeds the page state as JSON
+EMBEDDED_STATE_START = '<script id="__NEXT_DATA__" type="application/json">'
+EMBEDDED_STATE_END = "</script>"
+
+
+def find_embedded_ad(html: str) -> Optional[Dict[str, Any]]:
+    """
+    The listing in the page state embedded in `html`, or None when the page
+    has no state or it can't be read. The script block is located with a
+    substring search, so the rest of the page is never parsed.
+    """
+    start = html.find(EMBEDDED_STATE_START)
+    if start == -1:
+        return None
+    start += len(EMBEDDED_STATE_START)
+    end = html.find(EMBEDDED_STATE_END, start)
+    if end == -1:
+        return None
+
+    try:
+        state = ujson.loads(html[start:end])
+        ad = state["props"]["pageProps"]["ad"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return ad if isinstance(ad, dict) else None
+
+
+def _element(
+    name: str, attrs: Dict[str, Any], text: Optional[str] = None
+) -> StreamedElement:
+    element = StreamedElement(name, attrs)
+    if text is not None:
+        element._text.append(text)
+    return element
+
+
+class EmbeddedListing(ListingIndex):
+    """
+    `ListingIndex` filled from the listing in the embedded page state
+    instead of the HTML. The elements the `Otodom` extractors read are
+    rebuilt the way the page renders them, so they give the same record
+    without the page being parsed. Lookups the state has nothing for, a
+    missing part of the listing or a single missing characteristic, go to
+    the page itself, parsed by `parse_page` on first use.
+    """
+
+    def __init__(self, ad: Dict[str, Any], parse_page: Callable[[], Any]):
+        self.tags: Dict[str, List[StreamedElement]] = {
+            name: [] for name in INDEXED_TAGS
+        }
+        self.attributes = {}
+        self.additional_features = None
+        self._parse_page = parse_page
+        self._page_index: Optional[ListingIndex] = None
+
+        self._add_characteristics(ad.get("characteristics"))
+        self._add_url(ad.get("url"))
+        self._add_id(ad.get("id"))
+        self._add_address(ad.get("location"))
+        self._add_description(ad.get("description"))
+        self._add_features(ad.get("features"))
+
+    def find_all(self, name: str) -> List[StreamedElement]:
+        return super().find_all(name) or self.page_index().find_all(name)
+
+    def find_all_by_attribute(
+        self, attribute: str, value: str
+    ) -> List[StreamedElement]:
+        return super().find_all_by_attribute(
+            attribute, value
+        ) or self.page_index().find_all_by_attribute(attribute, value)
+
+    def page_index(self) -> ListingIndex:
+        if self._page_index is None:
+            self._page_index = get_listing_index(self._parse_page())
+        return self._page_index
+
+    def _add_characteristics(self, characteristics) -> None:
+        if not isinstance(characteristics, list):
+            return
+        for characteristic in characteristics:
+            label = characteristic.get("label")
+            value = characteristic.get("localizedValue")
+            if not label or value is None:
+                continue
+            row = _element("div", {"aria-label": label})
+            if label == "Cena":
+                row.contents = [value]
+            else:
+                value_div = _element("div", {"title": value})
+                value_div.contents = [value]
+                row.contents = [_element("div", {"title": label}), value_div]
+            self.attributes.setdefault(("aria-label", label), []).append(row)
+
+    def _add_url(self, url) -> None:
+        if not url:
+            return
+        self.tags["link"].append(
+            _element("link", {"rel": ["canonical"], "href": url})
+        )
+
+    def _add_id(self, ad_id) -> None:
+        if ad_id is None:
+            return
+        # As in the og:title meta tag of the page
+        self.tags["meta"].append(
+            _element("meta", {"content": f"{ad_id} • www.otodom.pl"})
+        )
+
+    def _add_address(self, location) -> None:
+        try:
+            address = location["address"][0]["value"]
+        except (KeyError, IndexError, TypeError):
+            return
+        self.tags["a"].append(_element("a", {}, address))
+
+    def _add_description(self, description) -> None:
+        if description is None:
+            return
+        # The description is an HTML fragment, only its text is kept
+        text = get_soup(description).get_text()
+        self.attributes[("data-cy", "adPageAdDescription")] = [
+            _element("div", {"data-cy": "adPageAdDescription"}, text)
+        ]
+
+    def _add_features(self, features) -> None:
+        if not isinstance(features, list):
+            return
+        feature_list = _element("ul", {})
+        feature_list.items = [
+            _element("li", {}, feature) for feature in features
+        ]
+        heading = _element("h3", {})
+        heading.next_siblings.append(feature_list)
+        self.tags["h3"].append(heading)
+
+
+def parse_embedded_listing(
+    html: str, parse_page: Callable[[str], Any]
+) -> Optional[EmbeddedListing]:
+    """
+    `EmbeddedListing` of the page, None when it has no embedded state.
+    `parse_page` parses the page for whatever the state lacks.
+    """
+    ad = find_embedded_ad(html)
+    if ad is None:
+        return None
+    return EmbeddedListing(ad, partial(parse_page, html))
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+import ujson
+
+# Parts of a listing page that change between requests while the listing
+# doesn't: the session of the request, tokens and the build of the site
+VOLATILE_PATTERNS = [
+    (
+        re.compile(r'"(userSessionId|sphereApiToken|buildId)":"[^"]*"'),
+        r'"\1":""',
+    ),
+    (re.compile(r' nonce="[^"]*"'), ' nonce=""'),
+]
+
+
+def page_hash(html: str) -> str:
+    """Hash of `html` without its volatile parts and whitespace changes."""
+    for pattern, replacement in VOLATILE_PATTERNS:
+        html = pattern.sub(replacement, html)
+    # Much faster than a regular expression on whole pages
+    html = " ".join(html.split())
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Records extracted from listing pages, by url, in an SQLite file. A
+    record is only returned for a page with the same hash (see `page_hash`)
+    extracted by the same `extractor_version`, so an unchanged page is
+    neither parsed nor extracted again. Records of an older version are
+    replaced as their pages are extracted again.
+    """
+
+    def __init__(self, path: str, extractor_version: int):
+        self.path = path
+        self.extractor_version = extractor_version
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # A record lost in a crash is only extracted again
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records (url TEXT PRIMARY KEY, "
+                "page_hash TEXT, extractor_version INTEGER, record TEXT)"
+            )
+
+    def get(self, url: str, html_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record FROM records WHERE url=? AND page_hash=? "
+                "AND extractor_version=?",
+                (url, html_hash, self.extractor_version),
+            ).fetchone()
+        return ujson.loads(row[0]) if row else None
+
+    def put(self, url: str, html_hash: str, record: Dict[str, Any]) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO records VALUES (?,?,?,?)",
+                (
+                    url,
+                    html_hash,
+                    self.extractor_version,
+                    ujson.dumps(record),
+                ),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+Concurrency = Union[int, Callable[[], int]]
+
+
+async def gather_with_concurrency(
+    fetch: Callable[[str], T],
+    urls: Iterable[str],
+    concurrency: Concurrency,
+    executor: ThreadPoolExecutor,
+) -> List[T]:
+    """
+    Run the blocking `fetch` for every url in the executor, keeping at most
+    `concurrency` calls in flight. `concurrency` may be a callable, in which
+    case the limit is re-read every time a slot is requested. Results are
+    returned in the order of `urls`.
+    """
+    loop = asyncio.get_running_loop()
+    limit = concurrency if callable(concurrency) else lambda: concurrency
+    slots = asyncio.Condition()
+    in_flight = 0
+
+    async def fetch_one(url: str) -> T:
+        nonlocal in_flight
+        async with slots:
+            await slots.wait_for(lambda: in_flight < max(1, limit()))
+            in_flight += 1
+        try:
+            return await loop.run_in_executor(executor, fetch, url)
+        finally:
+            async with slots:
+                in_flight -= 1
+                slots.notify_all()
+
+    return await asyncio.gather(*(fetch_one(url) for url in urls))
+
+
+def fetch_concurrently(
+    fetch: Callable[[str], T],
+    urls: Iterable[str],
+    concurrency: Concurrency,
+    max_workers: Optional[int] = None,
+) -> List[T]:
+    """
+    Synchronous entrypoint to `gather_with_concurrency`. The blocking `fetch`
+    keeps going through the same (cached) session, so cache semantics are
+    unchanged - only the waiting on round trips overlaps.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    if max_workers is None:
+        max_workers = concurrency() if callable(concurrency) else concurrency
+    max_workers = max(1, min(max_workers, len(urls)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return asyncio.run(
+            gather_with_concurrency(fetch, urls, concurrency, executor)
+        )
@@ -0,0 +1,216 @@
+import datetime
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+import ujson
+
+# Time of the scrape, a change of it is not a change of the listing
+TIMESTAMP_COLUMN = "created_at"
+
+# Long fields, only stored in full in the first record of a listing. Their
+# later changes are stored as a hash of the new value, the text itself is
+# in the data
+HASHED_FIELDS = ("ad_description",)
+
+Timestamp = Union[str, datetime.datetime]
+
+
+def _timestamp(value: Timestamp) -> str:
+    # Stored as text, sorted like the `created_at` of the records
+    if isinstance(value, datetime.datetime):
+        return str(value)
+    return value
+
+
+def _hash(value: Any) -> Any:
+    if value is None:
+        return None
+    return "sha256:" + hashlib.sha256(str(value).encode("utf-8")).hexdigest()
+
+
+def _value(value: Any) -> Any:
+    # Missing values are all stored as null
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class ListingHistory:
+    """
+    History of every listing, keyed by `unique_id`, in an SQLite file. The
+    first record of a listing is stored in full, later records only add
+    the fields that changed since, each with the time of its scrape. A
+    listing scraped again without changes takes no space. Changes of the
+    `HASHED_FIELDS`, e.g. a reworded description, are only stored as a
+    hash of the new value.
+
+    The latest state of every listing is kept aside to compare new records
+    with, and the changes are indexed by listing, field and time, so the
+    state of the listings at any time (`as_of`) and the history of a field
+    (`field_history`) don't scan every change. Records are expected in the
+    order they were scraped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS changes (unique_id INTEGER, "
+                "field TEXT, changed_at TEXT, value TEXT)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS changes_by_listing "
+                "ON changes (unique_id, field, changed_at)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS changes_by_time "
+                "ON changes (changed_at)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS latest "
+                "(unique_id INTEGER PRIMARY KEY, record TEXT)"
+            )
+
+    def add(
+        self,
+        records: Union[pd.DataFrame, Iterable[Dict[str, Any]]],
+        scraped_at: Optional[Timestamp] = None,
+    ) -> int:
+        """
+        Add the changes in `records` in a single transaction and return
+        their number. They are timed by `scraped_at`, by default by their
+        `created_at`. Records without a `unique_id` are skipped.
+        """
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict("records")
+
+        changes: List[Tuple[int, str, str, str]] = []
+        with self._lock, self._db:
+            for record in records:
+                unique_id = _value(record.get("unique_id"))
+                if unique_id is None:
+                    continue
+                unique_id = int(unique_id)
+                changed_at = _timestamp(
+                    scraped_at
+                    or record.get(TIMESTAMP_COLUMN)
+                    or datetime.datetime.now()
+                )
+
+                latest = self._latest(unique_id)
+                new_fields = {
+                    field: _value(value)
+                    for field, value in record.items()
+                    if field != TIMESTAMP_COLUMN
+                }
+                # The latest state keeps the hashes, to compare with
+                hashed_fields = {
+                    field: _hash(value) if field in HASHED_FIELDS else value
+                    for field, value in new_fields.items()
+                }
+                changed = {
+                    field: value
+                    for field, value in hashed_fields.items()
+                    if latest is None
+                    or field not in latest
+                    or latest[field] != value
+                }
+                if not changed:
+                    continue
+
+                changes.extend(
+                    (
+                        unique_id,
+                        field,
+                        changed_at,
+                        ujson.dumps(
+                            new_fields[field] if latest is None else value
+                        ),
+                    )
+                    for field, value in changed.items()
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO latest VALUES (?,?)",
+                    (unique_id, ujson.dumps({**(latest or {}), **changed})),
+                )
+            self._db.executemany(
+                "INSERT INTO changes VALUES (?,?,?,?)", changes
+            )
+        return len(changes)
+
+    def _latest(self, unique_id: int) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            "SELECT record FROM latest WHERE unique_id=?", (unique_id,)
+        ).fetchone()
+        return ujson.loads(row[0]) if row else None
+
+    def latest(self, unique_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._latest(unique_id)
+
+    def _state_as_of(
+        self, when: Timestamp, unique_id: Optional[int] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        # With MAX, SQLite takes the other columns from the row of the
+        # maximum, i.e. the last change of every field before `when`
+        query = (
+            "SELECT unique_id, field, value, MAX(changed_at) FROM changes "
+            "WHERE changed_at <= ?"
+        )
+        parameters: Tuple = (_timestamp(when),)
+        if unique_id is not None:
+            query += " AND unique_id=?"
+            parameters += (unique_id,)
+        query += " GROUP BY unique_id, field"
+
+        with self._lock:
+            rows = self._db.execute(query, parameters).fetchall()
+        listings: Dict[int, Dict[str, Any]] = {}
+        for listing_id, field, value, _ in rows:
+            listings.setdefault(listing_id, {})[field] = ujson.loads(value)
+        return listings
+
+    def as_of(self, when: Timestamp) -> pd.DataFrame:
+        """The listings as they were at `when`, one row per listing."""
+        return pd.DataFrame(list(self._state_as_of(when).values()))
+
+    def listing_as_of(
+        self, unique_id: int, when: Timestamp
+    ) -> Optional[Dict[str, Any]]:
+        """The listing `unique_id` as it was at `when`."""
+        return self._state_as_of(when, unique_id).get(unique_id)
+
+    def field_history(
+        self, unique_id: int, field: str
+    ) -> List[Tuple[str, Any]]:
+        """`(changed_at, value)` of every change of `field`, e.g. "price"."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT changed_at, value FROM changes "
+                "WHERE unique_id=? AND field=? ORDER BY changed_at",
+                (unique_id, field),
+            ).fetchall()
+        return [(changed_at, ujson.loads(value)) for changed_at, value in rows]
+
+    def __len__(self) -> int:
+        """Number of listings."""
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM latest"
+            ).fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
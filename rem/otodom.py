@@ -1,6 +1,15 @@
 import datetime
+import multiprocessing
 import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from itertools import islice
 
 import requests
 from requests import Response
@@ -8,7 +17,18 @@ from requests_cache import CachedSession
 
 from .logger import log
 import re
-from typing import Optional, Tuple, Dict, List
+from typing import (
+    Any,
+    Optional,
+    Tuple,
+    Dict,
+    List,
+    Iterable,
+    Iterator,
+    Deque,
+    FrozenSet,
+    Union,
+)
 from urllib.parse import parse_qs
 from urllib.parse import urlparse
 
@@ -17,10 +37,31 @@ import pandas as pd
 from bs4 import BeautifulSoup
 
 from rem import utils
+from rem.archive import HtmlArchive
+from rem.buffer import RowBuffer
+from rem.cache import get_compressed_session
+from rem.checkpoint import CrawlCheckpoint
+from rem.columns import GCP_COLUMNS, LISTING_COLUMNS
 from rem.config import settings
+from rem.embedded import EmbeddedListing, parse_embedded_listing
+from rem.extraction_cache import ExtractionCache, page_hash
+from rem.fetcher import fetch_concurrently
+from rem.history import ListingHistory
+from rem.ratelimit import (
+    AdaptiveRateController,
+    RateLimitedAdapter,
+    TokenBucket,
+    retry_delay,
+)
+from rem.seen import SeenListings
+from rem.sink import DataSink
+from rem.storage import data_file_path, resolve_data_format
+from rem.store import ListingStore
+from rem.streaming import StreamedListing, parse_listing
 
 from rem.utils import (
     _extract_divs,
+    get_listing_index,
     log_wrong_number,
     log_unexpected,
     load_data,
@@ -28,20 +69,96 @@ from rem.utils import (
     get_soup,
 )
 
+# A parsed listing page, either a full tree or only the parts the
+# extractors read
+Listing = Union[BeautifulSoup, StreamedListing, EmbeddedListing]
+
+# Data of a single listing, one value per column. It only becomes a row
+# of a DataFrame once it is added to the data
+Record = Dict[str, Any]
+
+# Version of the listing extractors, to be bumped whenever a change to them
+# changes the records, so records cached by older versions are not reused
+EXTRACTOR_VERSION = 2
+
+# Bit of every amenity in the `amenities` column, append only - the bits
+# of the existing amenities must not change
+AMENITIES = (
+    "air_conditioning",
+    "basement",
+    "elevator",
+    "balcony",
+    "garden",
+    "terrace",
+    "parking",
+    "garage",
+)
+
+
+def amenity_mask(*names: str) -> int:
+    """
+    Bitmask of the given amenities, e.g. listings with a balcony and an
+    elevator are `data.amenities & mask == mask` for
+    `mask = amenity_mask("balcony", "elevator")`.
+    """
+    mask = 0
+    for name in names:
+        mask |= 1 << AMENITIES.index(name)
+    return mask
+
+
+# Scraper of a parse worker process, set up once by `_init_parse_worker`
+_parse_worker: Optional["Otodom"] = None
+
+
+def _parse_pool_context() -> multiprocessing.context.BaseContext:
+    # Forked workers would inherit the locks of the threads fetching pages
+    # and the open sessions and files. Platforms without forkserver, e.g.
+    # Windows, spawn workers by default
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def _init_parse_worker(worker_settings) -> None:
+    global _parse_worker
+    _parse_worker = Otodom(worker_settings, offline=True)
+
+
+def _extract_record(html: str) -> Record:
+    return _parse_worker.extract_record(html)
+
 
 class Otodom:
-    def __init__(self, new_settings=None, session=None):
+    def __init__(self, new_settings=None, session=None, offline=False):
         global settings
         if new_settings:
             log.info(f"Overwriting settings manually with: {new_settings}")
             settings = new_settings
 
+        # Expired listings are revalidated with a conditional GET (ETag /
+        # Last-Modified), 0 would disable caching altogether:
+        revalidate_listings_after = settings.REVALIDATE_LISTINGS_AFTER
+        if revalidate_listings_after == 0:
+            revalidate_listings_after = 1
+
+        # Patterns are matched against the url without its scheme, hence the
+        # leading wildcard for the "www." subdomain
         urls_expire_after = {
-            'otodom.pl/pl/oferty/sprzedaz/mieszkanie/**': 120,
-            "otodom.pl/pl/oferta/**": -1,
+            '*otodom.pl/pl/oferty/sprzedaz/mieszkanie/**': 120,
+            "*otodom.pl/pl/oferta/**": revalidate_listings_after,
         }
 
-        if not session:
+        # Offline scrapers only extract data from pages passed to them
+        if offline:
+            self.session = None
+        elif not session and settings.CACHE_BACKEND == "compressed":
+            self.session = get_compressed_session(
+                os.sep.join([".cache", "otodom_compressed_cache"]),
+                max_size=settings.CACHE_MAX_SIZE,
+                urls_expire_after=urls_expire_after,
+            )
+        elif not session:
             self.session = CachedSession(
                 os.sep.join([".cache", "otodom_cache"]),
                 urls_expire_after=urls_expire_after,
@@ -56,15 +173,140 @@ class Otodom:
         self.page_limit = settings.PAGE_LIMIT
         self.gmaps = None
         self.data_file_name = settings.DATA_FILE_NAME
-        self.save_htmls = settings.SAVE_HTMLS
-
-        if settings.LOAD_FROM_DATA:
-            self.data = load_data(settings.DATA_FILE_NAME)
-        else:
-            self.data = pd.DataFrame({"url": []})
+        self.save_htmls = settings.SAVE_HTMLS and not offline
+        self.html_parser = utils.resolve_html_parser(settings.HTML_PARSER)
+        self.streaming_extraction = settings.STREAMING_EXTRACTION
+        self.embedded_state_extraction = settings.EMBEDDED_STATE_EXTRACTION
 
         self.save_to_file = settings.SAVE_TO_FILE
+        self.data_format = resolve_data_format(settings.DATA_FORMAT)
+        # Offline instances, e.g. parse workers, never open the data file
+        self.data_sink: Optional[Union[DataSink, ListingStore]] = None
+        if self.save_to_file and not offline:
+            if self.data_format == "sqlite":
+                self.data_sink = ListingStore(
+                    data_file_path(
+                        self.data_directory, self.data_file_name, "sqlite"
+                    )
+                )
+            else:
+                self.data_sink = DataSink(
+                    self.data_directory,
+                    self.data_file_name,
+                    self.data_format,
+                )
+            self.data_sink.recover()
+
+        # A resumed crawl adds to the data saved before it was interrupted
+        load_from_data = settings.LOAD_FROM_DATA or settings.RESUME
+        self.load_from_data = load_from_data
+        # The saved data is only read in full by `scrap`, which returns it
+        self.data = pd.DataFrame({"url": []})
+        # Rows of `data` already in the data file
+        self.saved_rows = 0
+        # Listings seen in earlier runs are only remembered along with the
+        # data they were saved to
+        seen_listings_path = None
+        if load_from_data and self.save_to_file and not offline:
+            seen_listings_path = os.sep.join(
+                [
+                    self.data_directory,
+                    f"{self.data_file_name}_seen.sqlite",
+                ]
+            )
+        self.seen_listings = SeenListings(seen_listings_path)
+        if load_from_data and not len(self.seen_listings):
+            # The index of data saved without one, from its urls alone
+            saved_urls = self.load_saved_data(columns=["url"])
+            if "url" in saved_urls.columns:
+                self.seen_listings.save(saved_urls["url"].dropna())
+        # New listings are collected here and added to `data` in batches
+        self.new_listings = RowBuffer()
+        self.row_buffer_size = settings.ROW_BUFFER_SIZE
+        # Changes of the saved listings over time
+        self.history = None
+        if settings.SAVE_HISTORY and self.save_to_file and not offline:
+            self.history = ListingHistory(
+                os.sep.join(
+                    [
+                        self.data_directory,
+                        f"{self.data_file_name}_history.sqlite",
+                    ]
+                )
+            )
+        # Progress of the crawl, to resume it if interrupted
+        self.checkpoint = None
+        if self.save_to_file and not offline:
+            self.checkpoint = CrawlCheckpoint(
+                os.sep.join(
+                    [
+                        self.data_directory,
+                        f"{self.data_file_name}_checkpoint.jsonl",
+                    ]
+                ),
+                resume=settings.RESUME,
+            )
+
         self.offset = settings.OFFSET
+        self.concurrent_requests = settings.CONCURRENT_REQUESTS
+        self.parse_workers = 0 if offline else settings.PARSE_WORKERS
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        # Records of the listing pages extracted before, by url and content
+        self.extraction_cache = None
+        if settings.EXTRACTION_CACHE and not offline:
+            self.extraction_cache = ExtractionCache(
+                os.sep.join([".cache", "otodom_extraction.sqlite"]),
+                EXTRACTOR_VERSION,
+            )
+        self.search_page_prefetch = settings.SEARCH_PAGE_PREFETCH
+
+        # OFFSET is kept as a shorthand for one request every OFFSET seconds
+        requests_per_second = settings.REQUESTS_PER_SECOND
+        if not requests_per_second and self.offset:
+            requests_per_second = 1 / self.offset
+        if not requests_per_second and settings.ADAPTIVE_RATE:
+            requests_per_second = settings.MIN_REQUESTS_PER_SECOND
+
+        self.max_retries = settings.MAX_RETRIES
+        self.retry_backoff = settings.RETRY_BACKOFF
+        self.cache_statistics = {
+            "cache_hits": 0,
+            "cache_revalidated": 0,
+            "cache_stale": 0,
+            "cache_misses": 0,
+        }
+        self._statistics_lock = threading.Lock()
+
+        self.search_page_max_staleness = settings.SEARCH_PAGE_MAX_STALENESS
+        self._background_refreshes: Dict[str, Future] = {}
+        self._refresh_lock = threading.Lock()
+        # Started on the first stale search page, see `_refresh_in_background`
+        self._refresh_executor: Optional[ThreadPoolExecutor] = None
+        self.rate_limiter = None
+        self.rate_controller = None
+        if requests_per_second and not offline:
+            self.rate_limiter = TokenBucket(
+                requests_per_second,
+                settings.REQUESTS_BURST,
+                settings.RATE_LIMIT_STATE_FILE,
+            )
+            if settings.ADAPTIVE_RATE:
+                self.rate_controller = AdaptiveRateController(
+                    self.rate_limiter,
+                    min_rate=settings.MIN_REQUESTS_PER_SECOND,
+                    max_rate=settings.MAX_REQUESTS_PER_SECOND,
+                    target_latency=settings.TARGET_LATENCY,
+                    max_concurrency=self.concurrent_requests,
+                )
+            for prefix in ["https://", "http://"]:
+                self.session.mount(
+                    prefix,
+                    RateLimitedAdapter(
+                        self.rate_limiter,
+                        self.session.get_adapter(prefix),
+                        self.rate_controller,
+                    ),
+                )
         self.time_of_departure = settings.TIME_OF_DEPARTURE
         self.time_of_departure_not_transit = (
             settings.TIME_OF_DEPARTURE_NOT_TRANSIT
@@ -83,7 +325,12 @@ class Otodom:
             )
 
         self.save_htmls_dir_path = None
-        if settings.SAVE_HTMLS:
+        self.html_archive = None
+        if self.save_htmls and settings.SAVE_HTMLS_FORMAT == "archive":
+            self.html_archive = HtmlArchive(
+                os.sep.join([settings.DATA_DIRECTORY, "html_archive"])
+            )
+        elif self.save_htmls:
             self.save_htmls_dir_path = os.sep.join(
                 [settings.DATA_DIRECTORY, "htmls"]
             )
@@ -127,62 +374,132 @@ class Otodom:
         ]
 
     def scrap(self):
+        statistics: Dict = {}
+        for _ in self._crawl(statistics, keep_data=True):
+            pass
+        return self.data, statistics
+
+    def iter_listings(self) -> Iterator[Record]:
+        """
+        Crawl like `scrap`, but yield the record of every new listing as it
+        is extracted instead of returning them all at the end. Rows are only
+        kept in `data` until their search page is saved, so memory doesn't
+        grow with the length of the crawl. The data file is merged from the
+        saved pages once the crawl ends, a chunk at a time (SQLite stores
+        need no merging).
+        """
+        return self._crawl({}, keep_data=False)
+
+    def _crawl(self, statistics: Dict, keep_data: bool) -> Iterator[Record]:
         generator = self.url_generator()
 
-        statistics = {
-            "search_pages": 0,
-            "total_urls_checked": 0,
-            "new_urls": 0,
-            "standard_urls_checked": 0,
-            "promoted_urls_checked": 0,
-            "time_elapsed": 0,
-        }
+        statistics.update(
+            {
+                "search_pages": 0,
+                "total_urls_checked": 0,
+                "new_urls": 0,
+                "standard_urls_checked": 0,
+                "promoted_urls_checked": 0,
+                "time_elapsed": 0,
+            }
+        )
         search_url_count = 0
+        if keep_data and self.load_from_data and self.data.empty:
+            # New rows are added to the saved data
+            self.data = self.load_saved_data()
+            self.saved_rows = len(self.data)
+        elif not keep_data:
+            # Loaded data is in the data file already
+            self.data = self.data.iloc[:0]
+            self.saved_rows = 0
         start_time = time.time()
 
-        for search_url_count, url in enumerate(generator):
-            listing_soups: list = []
-            metadata: Dict = self._reset_metadata()
+        search_urls = islice(generator, self.page_limit)
+        if self.checkpoint:
+            search_urls = (
+                url
+                for url in search_urls
+                if not self.checkpoint.is_finished(url)
+            )
+        search_pages = self.prefetch_search_pages(search_urls)
 
-            if search_url_count == self.page_limit:
+        try:
+            for search_url_count, (url, search_page) in enumerate(
+                search_pages
+            ):
+                listings: list = []
+                metadata: Dict = self._reset_metadata()
+                page_finished = False
+
+                try:
+                    listings_urls, metadata = search_page.result()
+
+                    if len(listings_urls) == 0:
+                        log.info(
+                            "No relevant listing urls found on the search page. Terminating."
+                        )
+                        break
+
+                    if self.extraction_cache is not None:
+                        listings = self.get_pages_from_listing_urls(
+                            listings_urls
+                        )
+                        records = self.extract_listing_pages(listings)
+                    elif self.parse_workers:
+                        listings = self.get_htmls_from_listing_urls(
+                            listings_urls
+                        )
+                        records = self.extract_listing_htmls(listings)
+                    else:
+                        listings = self.get_soups_from_listing_urls(
+                            listings_urls
+                        )
+                        records = self.extract_listing_soups(listings)
+                    for record in records:
+                        self.add_new_listing_data(record)
+                        yield record
+                    page_finished = True
+
+                except requests.exceptions.RequestException as ex:
+                    log.exception(f"Unexpected {ex=}, {type(ex)=}")
+                finally:
+                    # Rows of a page that failed halfway are kept as well
+                    self.flush_new_listing_data()
+                    statistics["standard_urls_checked"] += metadata["standard"]
+                    statistics["promoted_urls_checked"] += metadata["promoted"]
+                    statistics["new_urls"] += len(listings)
+                    if self.data_sink is not None:
+                        self.save_new_listing_data()
+                    if page_finished and self.checkpoint:
+                        self.checkpoint.finish_page(url)
+                    if not keep_data:
+                        self.data = self.data.iloc[:0]
+                        self.saved_rows = 0
+                    if self.rate_controller:
+                        log.info(
+                            f"Crawl rate: {self.rate_controller.statistics()}"
+                        )
+            else:
+                search_url_count = self.page_limit
                 log.info(
                     f"Reached page limit of {self.page_limit}. Terminating."
                 )
-                break
-
-            log.info(f"Requesting search page HTML from url {url}")
-
-            try:
-                search_soup = self.get_soup_from_url(
-                    url,
-                )
-
-                (
-                    listings_urls,
-                    metadata,
-                ) = self.get_all_relevant_listing_urls_for_page(search_soup)
-
-                if len(listings_urls) == 0:
-                    log.info(
-                        "No relevant listing urls found on the search page. Terminating."
-                    )
-                    break
-
-                listing_soups = self.get_soups_from_listing_urls(listings_urls)
-
-                self.process_listing_soups(listing_soups)
-
-            except requests.exceptions.RequestException as ex:
-                log.exception(f"Unexpected {ex=}, {type(ex)=}")
-            finally:
-                statistics["standard_urls_checked"] += metadata["standard"]
-                statistics["promoted_urls_checked"] += metadata["promoted"]
-                statistics["new_urls"] += len(listing_soups)
-                if self.save_to_file:
-                    utils.save_data(
-                        self.data, self.data_file_name, self.data_directory
-                    )
+        finally:
+            search_pages.close()
+            self.close_parse_pool()
+            self.close_refresh_executor()
+            if self.data_sink is not None:
+                # Without the data, it's merged from the saved rows
+                if keep_data:
+                    self.data_sink.compact(self.data)
+                else:
+                    self.data_sink.compact(parts_only=not self.load_from_data)
+            if self.checkpoint:
+                self.checkpoint.close()
 
+        # Not reached when interrupted, the checkpoint is kept to resume
+        if self.checkpoint:
+            self.checkpoint.clear()
         end_time = time.time()
 
         statistics["search_pages"] = search_url_count
@@ -191,28 +508,210 @@ class Otodom:
             + statistics["promoted_urls_checked"]
         )
         statistics["time_elapsed"] = end_time - start_time
+        statistics.update(self.cache_statistics)
+        if self.rate_controller:
+            statistics.update(self.rate_controller.statistics())
 
         log.info(f"Finished scraping. Summary:")
         log.info(statistics)
 
-        return self.data, statistics
+    def prefetch_search_pages(
+        self, urls: Iterable[str]
+    ) -> Iterator[Tuple[str, Future]]:
+        """
+        Yield `(url, future)` pairs for the search pages, where the future
+        resolves to the listing urls and metadata of that page. While a page
+        is being processed, up to `search_page_prefetch` following pages are
+        already fetched in the background.
+        """
+        urls = iter(urls)
+        pending: Deque[Tuple[str, Future]] = deque()
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, self.search_page_prefetch)
+        )
+
+        def submit(search_url: str) -> None:
+            pending.append(
+                (
+                    search_url,
+                    executor.submit(
+                        self.get_listing_urls_to_scrap, search_url
+                    ),
+                )
+            )
+
+        try:
+            while True:
+                # The page to yield and the pages fetched while it is
+                # processed, topped up only once the previous one is done
+                for url in islice(
+                    urls, self.search_page_prefetch + 1 - len(pending)
+                ):
+                    submit(url)
+                if not pending:
+                    break
+                yield pending.popleft()
+        finally:
+            for _, search_page in pending:
+                search_page.cancel()
+            executor.shutdown(wait=True)
+
+    def get_listing_urls_for_search_url(
+        self, url: str
+    ) -> Tuple[List[str], Dict[str, int]]:
+        log.info(f"Requesting search page HTML from url {url}")
+        search_soup = self.get_soup_from_url(url)
+        return self.get_all_relevant_listing_urls_for_page(search_soup)
+
+    def get_listing_urls_to_scrap(
+        self, url: str
+    ) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Listing urls and metadata of the search page at `url`, recorded in
+        the checkpoint. Pages of a resumed crawl come from the checkpoint
+        instead, without the listings saved already.
+        """
+        if self.checkpoint is None:
+            return self.get_listing_urls_for_search_url(url)
+        resumed_page = self.checkpoint.resumed_page(url)
+        if resumed_page is not None:
+            log.info(f"Resuming search page {url} from the checkpoint")
+            return resumed_page
+        listing_urls, metadata = self.get_listing_urls_for_search_url(url)
+        self.checkpoint.start_page(url, listing_urls, metadata)
+        return listing_urls, metadata
 
     def get_soups_from_listing_urls(self, listing_urls):
-        listing_soups = [
-            self.get_soup_from_url(url)
+        return self._fetch_listing_urls(
+            listing_urls, self.get_listing_from_url
+        )
+
+    def get_htmls_from_listing_urls(self, listing_urls) -> List[str]:
+        return self._fetch_listing_urls(listing_urls, self.get_html_from_url)
+
+    def get_pages_from_listing_urls(
+        self, listing_urls
+    ) -> List[Tuple[str, str]]:
+        return self._fetch_listing_urls(
+            listing_urls, lambda url: (url, self.get_html_from_url(url))
+        )
+
+    def _fetch_listing_urls(self, listing_urls, fetch) -> list:
+        urls_to_fetch = [
+            url
             for url in listing_urls
             if self.download_old_listings or self.is_url_new(url)
         ]
-        return listing_soups
+
+        if self.concurrent_requests > 1:
+            return fetch_concurrently(
+                fetch,
+                urls_to_fetch,
+                self.get_concurrent_requests,
+                max_workers=self.concurrent_requests,
+            )
+
+        return [fetch(url) for url in urls_to_fetch]
+
+    def get_concurrent_requests(self) -> int:
+        if self.rate_controller:
+            return self.rate_controller.concurrency
+        return self.concurrent_requests
 
     def process_listing_soups(self, listings: List[BeautifulSoup]):
+        for listing_data in self.extract_listing_soups(listings):
+            self.add_new_listing_data(listing_data)
+        self.flush_new_listing_data()
+
+    def process_listing_htmls(self, htmls: List[str]):
+        for record in self.extract_listing_htmls(htmls):
+            self.add_new_listing_data(record)
+        self.flush_new_listing_data()
+
+    def extract_listing_soups(
+        self, listings: List[BeautifulSoup]
+    ) -> Iterator[Record]:
         for listing in listings:
             listing_data = self.get_data_from_listing(listing)
 
             if self.use_google_maps_api:
-                listing_data.append(self.get_gcp_data_from_listing(listing))
+                listing_data.update(self.get_gcp_data_from_listing(listing))
 
-            self.add_new_listing_data(listing_data)
+            yield listing_data
+
+    def extract_listing_htmls(self, htmls: List[str]) -> Iterator[Record]:
+        """
+        Like `extract_listing_soups`, but the pages are parsed and extracted
+        in `parse_workers` processes. Only the HTML is sent to them and plain
+        dict records come back, in the order of `htmls`.
+        """
+        for record in self.get_parse_pool().map(_extract_record, htmls):
+            if self.use_google_maps_api:
+                record.update(self.get_gcp_data_from_record(record))
+
+            yield record
+
+    def extract_listing_pages(
+        self, pages: List[Tuple[str, str]]
+    ) -> Iterator[Record]:
+        """
+        Records of the `(url, html)` listing pages. Pages unchanged since
+        they were last extracted get their record from `extraction_cache`,
+        with a new creation time. The others are extracted like in
+        `extract_listing_htmls` (in the main process without parse workers)
+        and cached.
+        """
+        hashes = [page_hash(html) for _, html in pages]
+        cached = [
+            self.extraction_cache.get(url, html_hash)
+            for (url, _), html_hash in zip(pages, hashes)
+        ]
+        htmls = [
+            html for (_, html), record in zip(pages, cached) if record is None
+        ]
+        log.info(f"Extracting {len(htmls)} of {len(pages)} listings")
+        if self.parse_workers:
+            extracted = self.get_parse_pool().map(_extract_record, htmls)
+        else:
+            extracted = map(self.extract_record, htmls)
+
+        for (url, _), html_hash, record in zip(pages, hashes, cached):
+            if record is None:
+                record = next(extracted)
+                self.extraction_cache.put(url, html_hash, record)
+            else:
+                record.update(self.get_creation_time(None))
+
+            if self.use_google_maps_api:
+                record.update(self.get_gcp_data_from_record(record))
+
+            yield record
+
+    def get_parse_pool(self) -> ProcessPoolExecutor:
+        if self._parse_pool is None:
+            worker_settings = settings.copy(
+                update={
+                    "LOAD_FROM_DATA": False,
+                    "RESUME": False,
+                    "SAVE_HISTORY": False,
+                    "EXTRACTION_CACHE": False,
+                    "USE_GOOGLE_MAPS_API": False,
+                    "SAVE_HTMLS": False,
+                    "PARSE_WORKERS": 0,
+                }
+            )
+            self._parse_pool = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=_parse_pool_context(),
+                initializer=_init_parse_worker,
+                initargs=(worker_settings,),
+            )
+        return self._parse_pool
+
+    def close_parse_pool(self) -> None:
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=True)
+            self._parse_pool = None
 
     def url_generator(self):
         parsed_url = urlparse(self.base_search_url)
@@ -225,21 +724,62 @@ class Otodom:
             yield f"{base_url}?page={page_value}&limit={limit_value}"
             page_value += 1
 
-    def get_data_from_listing(self, listing):
-        listing_data: pd.Series = pd.Series(dtype=str)
+    def extract_record(self, html: str) -> Record:
+        """
+        Record of the listing page `html` as a plain dict. Extracted bs4
+        strings are converted to `str`, they drag the whole parse tree
+        along when pickled.
+        """
+        listing_data = self.get_data_from_listing(self.parse_listing(html))
+        return {
+            key: str(value) if isinstance(value, str) else value
+            for key, value in listing_data.items()
+        }
+
+    def get_data_from_listing(self, listing) -> Record:
+        listing_data: Record = dict.fromkeys(LISTING_COLUMNS)
 
         for listing_extractor in self.listing_information_retrieval_methods:
             try:
-                outcome = listing_extractor(listing)
-                data = pd.Series(outcome)
-                listing_data = listing_data.append(data)
+                listing_data.update(listing_extractor(listing))
             except Exception as e:
                 log.error(f"Exception in extractor {listing_extractor}: {e}")
+        listing_data.update(self.get_amenities(listing_data))
 
         return listing_data
 
-    def add_new_listing_data(self, listing_data: pd.Series):
-        self.data = self.data.append(listing_data, ignore_index=True)
+    def add_new_listing_data(self, listing_data: Record):
+        self.new_listings.append(listing_data)
+        if listing_data.get("url"):
+            self.seen_listings.add(listing_data["url"])
+        if len(self.new_listings) >= self.row_buffer_size:
+            self.flush_new_listing_data()
+
+    def load_saved_data(
+        self, columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """The data file, only its `columns` if given."""
+        return load_data(
+            self.data_file_name,
+            self.data_directory,
+            columns=columns,
+            data_format=self.data_format,
+        )
+
+    def flush_new_listing_data(self) -> None:
+        self.data = self.new_listings.flush_into(self.data)
+
+    def save_new_listing_data(self) -> None:
+        new_rows = self.data.iloc[self.saved_rows :]
+        self.data_sink.append(new_rows)
+        self.saved_rows = len(self.data)
+        if "url" in new_rows.columns:
+            saved_urls = new_rows["url"].dropna()
+            self.seen_listings.save(saved_urls)
+            if self.checkpoint:
+                self.checkpoint.save_listings(saved_urls)
+        if self.history:
+            self.history.add(new_rows)
 
     def get_all_relevant_listing_urls_for_page(self, search_soup):
         lis_standard = self.get_standard_listing_urls_for_page(search_soup)
@@ -619,7 +1159,7 @@ class Otodom:
     def get_unique_id(soup: BeautifulSoup) -> Dict[str, Optional[int]]:
         tags_content = []
 
-        for tags in soup.find_all('meta'):
+        for tags in get_listing_index(soup).find_all("meta"):
             tags_content.append(tags.get('content'))
 
         indices = []
@@ -743,7 +1283,7 @@ class Otodom:
     @staticmethod
     def get_address(soup: BeautifulSoup) -> dict[str, Optional[str]]:
         address_list = []
-        for a in soup.findAll('a'):
+        for a in get_listing_index(soup).find_all("a"):
             address_list.append(a.text)
 
         indices = []
@@ -764,12 +1304,19 @@ class Otodom:
 
     @staticmethod
     def get_listing_url(soup: BeautifulSoup):
-        link = soup.select('link[rel="canonical"]')[0].get("href")
+        link = get_listing_index(soup).canonical_url()
         return {"url": link}
 
     @staticmethod
     def get_seller_type(soup: BeautifulSoup) -> Dict[str, Optional[str]]:
-        seller_type = soup.find("a", {"class": "css-1dd80io enlr3ze0"})
+        seller_type = next(
+            (
+                a
+                for a in get_listing_index(soup).find_all("a")
+                if a.get("class") == ["css-1dd80io", "enlr3ze0"]
+            ),
+            None,
+        )
         if not seller_type:
             seller_type = "private"
         else:
@@ -783,14 +1330,29 @@ class Otodom:
 
     @staticmethod
     def get_ad_description(soup: BeautifulSoup) -> Dict[str, Optional[str]]:
-        ad_description = soup.find(
-            "div", {"data-cy": "adPageAdDescription"}
+        ad_description = next(
+            div
+            for div in get_listing_index(soup).find_all_by_attribute(
+                "data-cy", "adPageAdDescription"
+            )
+            if div.name == "div"
         ).getText()
         return {"ad_description": ad_description}
 
     @staticmethod
-    def resolve_additional_features(soup: BeautifulSoup) -> set:
-        h3_tags = soup.findAll('h3')
+    def resolve_additional_features(soup: BeautifulSoup) -> FrozenSet[str]:
+        # Shared by all amenity extractors, so the features are resolved
+        # once per listing
+        index = get_listing_index(soup)
+        if index.additional_features is None:
+            index.additional_features = frozenset(
+                Otodom._resolve_additional_features(index)
+            )
+        return index.additional_features
+
+    @staticmethod
+    def _resolve_additional_features(index: utils.ListingIndex) -> set:
+        h3_tags = index.find_all("h3")
         additional_features = set()
         for tag in h3_tags:
             uls = []
@@ -879,7 +1441,7 @@ class Otodom:
 
     def get_basement(self, soup: BeautifulSoup) -> Dict[str, int]:
         additional_features = self.resolve_additional_features(soup)
-        basement_list = ["klimatyzacja"]
+        basement_list = ["piwnica"]
         basement_in_listing = set()
         basement = 0
         for attribute in additional_features:
@@ -890,6 +1452,18 @@ class Otodom:
 
         return {"basement": basement}
 
+    @staticmethod
+    def get_amenities(listing_data: Record) -> Dict[str, Optional[int]]:
+        # Read from the columns of the amenity extractors, which have to run
+        # first, None when one of them failed
+        if any(listing_data.get(name) is None for name in AMENITIES):
+            return {"amenities": None}
+        return {
+            "amenities": amenity_mask(
+                *[name for name in AMENITIES if listing_data[name]]
+            )
+        }
+
     def extract_long_lat_via_address(self, address: str):
         geocode_result = self.gmaps.geocode(address)
         geometry = geocode_result[0]['geometry']
@@ -898,9 +1472,7 @@ class Otodom:
         return {"latitude": lat, "longitude": lon}
 
     def is_url_new(self, url):
-        return "url" not in self.data.columns or url not in set(
-            self.data["url"]
-        )
+        return url not in self.seen_listings
 
     def get_transit_time_distance(self, latitude, longitude):
         origin = (latitude, longitude)
@@ -1007,10 +1579,32 @@ class Otodom:
         }
 
     def get_soup_from_url(self, url: str) -> BeautifulSoup:
+        html = self.get_html_from_url(url)
+        soup = get_soup(html, self.html_parser)
+        return soup
+
+    def get_listing_from_url(self, url: str) -> Listing:
+        return self.parse_listing(self.get_html_from_url(url))
+
+    def parse_listing(self, html: str) -> Listing:
+        if self.embedded_state_extraction:
+            listing = parse_embedded_listing(html, self.parse_page)
+            if listing is not None:
+                return listing
+        return self.parse_page(html)
+
+    def parse_page(self, html: str) -> Listing:
+        if self.streaming_extraction:
+            return parse_listing(html)
+        return get_soup(html, self.html_parser)
+
+    def get_html_from_url(self, url: str) -> str:
         page = self.get_website(url)
         html = get_html_doc(page)
 
-        if self.save_htmls and self.data_directory:
+        if self.html_archive is not None:
+            self.html_archive.write(url, html)
+        elif self.save_htmls and self.data_directory:
             file_name = url.split("/")[-1]
             try:
                 save_path = os.sep.join(
@@ -1021,24 +1615,33 @@ class Otodom:
             except FileNotFoundError as ex:
                 log.error(f"Directory {save_path} does not exist! {ex=}")
 
-        soup = get_soup(html)
-        return soup
-
-    def get_gcp_data_from_listing(self, listing: BeautifulSoup) -> pd.Series:
-        listing_data = pd.Series()
+        return html
 
+    def get_gcp_data_from_listing(self, listing: BeautifulSoup) -> Record:
         coordinates = self.extract_long_lat_from_listing(listing)
+        return self.get_gcp_data_from_coordinates(coordinates)
+
+    def get_gcp_data_from_record(self, record: Record) -> Record:
+        coordinates = None
+        if record.get("address"):
+            coordinates = self.extract_long_lat_via_address(record["address"])
+        return self.get_gcp_data_from_coordinates(coordinates)
+
+    def get_gcp_data_from_coordinates(
+        self, coordinates: Optional[Dict]
+    ) -> Record:
+        listing_data: Record = dict.fromkeys(GCP_COLUMNS)
+
         if not coordinates:
             return listing_data
-        listing_data.append(pd.Series(coordinates))
+        listing_data.update(coordinates)
 
         longitude = coordinates["longitude"]
         latitude = coordinates["latitude"]
 
         for gcp_extractor in self.gcp_extractors:
             try:
-                extracted = pd.Series(gcp_extractor(latitude, longitude))
-                listing_data = listing_data.append(extracted)
+                listing_data.update(gcp_extractor(latitude, longitude))
             except Exception as e:
                 log.error(f"Exception in GCP extractor {gcp_extractor}: {e}")
         return listing_data
@@ -1053,14 +1656,133 @@ class Otodom:
 
     def get_website(self, url: str) -> Response:
         log.info(f"Requesting from url {url}...")
-        try:
-            page = self.session.get(url, timeout=settings.TIMEOUT)
-            if not page.from_cache:
-                time.sleep(self.offset)
-        except requests.exceptions.Timeout as ex:
-            log.exception(
-                f"Timeout {ex=} error when requesting {url=}! {type(ex)=}"
+        cached_page = self._get_cached_search_page(url)
+        if cached_page is not None:
+            return cached_page
+
+        for attempt in range(self.max_retries + 1):
+            is_last_attempt = attempt == self.max_retries
+            try:
+                page = self._request(url)
+            except requests.exceptions.Timeout as ex:
+                log.exception(
+                    f"Timeout {ex=} error when requesting {url=}! {type(ex)=}"
+                )
+                if is_last_attempt:
+                    raise requests.RequestException(
+                        f"Timed out requesting {url}"
+                    ) from ex
+                time.sleep(retry_delay(None, attempt, self.retry_backoff))
+                continue
+
+            if not (page.status_code == 429 or page.status_code >= 500):
+                return page
+            if is_last_attempt:
+                # An error page is not parsed as a listing
+                page.raise_for_status()
+
+            delay = retry_delay(page, attempt, self.retry_backoff)
+            log.warning(
+                f"Received {page.status_code} when requesting {url=}, "
+                f"retrying in {delay:.1f}s "
+                f"({attempt + 1}/{self.max_retries})..."
             )
-            raise requests.RequestException
+            time.sleep(delay)
+
+    def _request(self, url: str) -> Response:
+        not_modified = []
+
+        def track_not_modified(response, *args, **kwargs):
+            # Called for the network response, before the cache swaps it
+            # for the stored one
+            if response.status_code == 304:
+                not_modified.append(response)
+
+        page = self.session.get(
+            url,
+            timeout=settings.TIMEOUT,
+            hooks={"response": track_not_modified},
+        )
+
+        if not_modified:
+            outcome = "cache_revalidated"
+        elif getattr(page, "from_cache", False):
+            outcome = "cache_hits"
+        else:
+            outcome = "cache_misses"
+        self._record_cache_outcome(outcome)
 
         return page
+
+    def _record_cache_outcome(self, outcome: str) -> None:
+        with self._statistics_lock:
+            self.cache_statistics[outcome] += 1
+
+    def _get_cached_search_page(self, url: str) -> Optional[Response]:
+        """
+        Stale-while-revalidate for search pages: an expired page that is at
+        most `search_page_max_staleness` seconds past its expiry is returned
+        straight from the cache while a background refresh updates it.
+        """
+        cache = getattr(self.session, "cache", None)
+        if (
+            not self.search_page_max_staleness
+            or cache is None
+            or not utils.is_search_url(url)
+        ):
+            return None
+
+        # The key has to be built the way the session builds it on send
+        request = self.session.prepare_request(requests.Request("GET", url))
+        send_kwargs = self.session.merge_environment_settings(
+            url, {}, None, None, None
+        )
+        page = cache.get_response(cache.create_key(request, **send_kwargs))
+        if page is None:
+            return None
+
+        if not page.is_expired:
+            self._record_cache_outcome("cache_hits")
+            return page
+
+        staleness = (datetime.datetime.utcnow() - page.expires).total_seconds()
+        if staleness > self.search_page_max_staleness:
+            return None
+
+        log.info(f"Serving stale search page {url=}, refreshing it...")
+        self._record_cache_outcome("cache_stale")
+        self._refresh_in_background(url)
+        return page
+
+    def _refresh_in_background(self, url: str) -> None:
+        with self._refresh_lock:
+            if url in self._background_refreshes:
+                return
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=1)
+            refresh = self._refresh_executor.submit(self._request, url)
+            self._background_refreshes[url] = refresh
+
+        def on_refreshed(future: Future) -> None:
+            with self._refresh_lock:
+                self._background_refreshes.pop(url, None)
+            if future.exception():
+                log.error(
+                    f"Refreshing search page {url=} failed: "
+                    f"{future.exception()}"
+                )
+
+        refresh.add_done_callback(on_refreshed)
+
+    def wait_for_background_refreshes(self) -> None:
+        with self._refresh_lock:
+            refreshes = list(self._background_refreshes.values())
+        for refresh in refreshes:
+            refresh.exception()
+
+    def close_refresh_executor(self) -> None:
+        with self._refresh_lock:
+            executor, self._refresh_executor = self._refresh_executor, None
+        if executor is not None:
+            # Waits for the refreshes already started
+            executor.shutdown(wait=True)
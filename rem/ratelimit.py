@@ -0,0 +1,238 @@
+import asyncio
+import datetime
+import math
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+import ujson
+from requests.adapters import BaseAdapter
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+def retry_delay(
+    response: Optional[requests.Response], attempt: int, backoff: float
+) -> float:
+    """
+    Seconds to wait before retrying a request that failed on its `attempt`
+    (from 0): the Retry-After of `response`, in seconds or as a date, if
+    it has one, otherwise `backoff` doubled for every earlier attempt.
+    """
+    retry_after = (
+        response.headers.get("Retry-After") if response is not None else None
+    )
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            pass
+        else:
+            now = datetime.datetime.now(retry_at.tzinfo)
+            return max(0.0, (retry_at - now).total_seconds())
+    return backoff * 2**attempt
+
+
+class TokenBucket:
+    """
+    Per-host token bucket. Every request reserves one token; when the bucket
+    is empty the caller is told how long to wait for its reserved token, so
+    requests are spaced at exactly `rate` per second after the initial
+    `burst`.
+
+    If `state_file` is given, the buckets are kept in that file under an
+    exclusive lock, so threads, event loops and separate worker processes on
+    the same machine all draw from one budget.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        state_file: Optional[str] = None,
+    ):
+        if rate <= 0:
+            raise ValueError(f"Rate has to be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}
+
+        if self.state_file:
+            parent_dir = os.path.dirname(self.state_file)
+            if parent_dir:
+                os.makedirs(parent_dir, exist_ok=True)
+
+    def reserve(self, host: str) -> float:
+        """
+        Take a token for `host` and return the number of seconds the caller
+        has to wait before using it.
+        """
+        with self._lock:
+            if not self.state_file:
+                return self._reserve(self._buckets, host, time.time())
+
+            with open(self.state_file, "a+") as state:
+                if fcntl:
+                    fcntl.flock(state, fcntl.LOCK_EX)
+                try:
+                    state.seek(0)
+                    content = state.read()
+                    buckets = ujson.loads(content) if content else {}
+                    wait = self._reserve(buckets, host, time.time())
+                    state.seek(0)
+                    state.truncate()
+                    state.write(ujson.dumps(buckets))
+                    state.flush()
+                finally:
+                    if fcntl:
+                        fcntl.flock(state, fcntl.LOCK_UN)
+            return wait
+
+    def _reserve(self, buckets: Dict, host: str, now: float) -> float:
+        tokens, updated_at = buckets.get(host, (self.burst, now))
+        tokens = min(
+            self.burst, tokens + max(0.0, now - updated_at) * self.rate
+        )
+        tokens -= 1
+        buckets[host] = [tokens, now]
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    def acquire(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class AdaptiveRateController:
+    """
+    AIMD controller for a `TokenBucket`. Every healthy response (fast enough
+    and not throttled) raises the rate additively; a 429, a 5xx or a timeout
+    cuts it multiplicatively. The number of concurrent requests follows from
+    the rate via Little's law (rate * target latency).
+    """
+
+    THROTTLING_STATUS_CODES = {429}
+
+    def __init__(
+        self,
+        limiter: TokenBucket,
+        min_rate: float,
+        max_rate: float,
+        target_latency: float,
+        max_concurrency: int = 1,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+    ):
+        self.limiter = limiter
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.target_latency = target_latency
+        self.max_concurrency = max(1, max_concurrency)
+        self.increase = increase
+        self.decrease = decrease
+        self.backoffs = 0
+        self._last_backoff = 0.0
+        self._lock = threading.Lock()
+        self.limiter.rate = min(max(limiter.rate, min_rate), self.max_rate)
+
+    @property
+    def rate(self) -> float:
+        return self.limiter.rate
+
+    @property
+    def concurrency(self) -> int:
+        concurrency = math.floor(self.rate * self.target_latency)
+        return min(max(1, concurrency), self.max_concurrency)
+
+    def is_failure(self, status_code: Optional[int]) -> bool:
+        return (
+            status_code is None
+            or status_code in self.THROTTLING_STATUS_CODES
+            or status_code >= 500
+        )
+
+    def record(self, latency: float, status_code: Optional[int]) -> None:
+        """
+        Register the outcome of a request; `status_code` is None when the
+        request timed out.
+        """
+        with self._lock:
+            if self.is_failure(status_code):
+                self._back_off()
+            elif latency <= self.target_latency:
+                self.limiter.rate = min(
+                    self.max_rate, self.limiter.rate + self.increase
+                )
+
+    def _back_off(self) -> None:
+        # Requests already in flight fail together - react once per window.
+        now = time.time()
+        if now - self._last_backoff < self.target_latency:
+            return
+        self._last_backoff = now
+        self.backoffs += 1
+        self.limiter.rate = max(
+            self.min_rate, self.limiter.rate * self.decrease
+        )
+
+    def statistics(self) -> Dict[str, float]:
+        return {
+            "requests_per_second": round(self.rate, 3),
+            "concurrent_requests": self.concurrency,
+            "backoffs": self.backoffs,
+        }
+
+
+class RateLimitedAdapter(BaseAdapter):
+    """
+    Transport adapter acquiring a token before a request hits the network.
+    Mounted on a (cached) session it is only reached on cache misses, so
+    responses served from the cache are never throttled. If a controller is
+    given, it is fed the latency and status of every response.
+    """
+
+    def __init__(
+        self,
+        limiter: TokenBucket,
+        adapter: BaseAdapter,
+        controller: Optional[AdaptiveRateController] = None,
+    ):
+        super().__init__()
+        self.limiter = limiter
+        self.adapter = adapter
+        self.controller = controller
+
+    def send(self, request, **kwargs):
+        self.limiter.acquire(urlparse(request.url).netloc)
+        if not self.controller:
+            return self.adapter.send(request, **kwargs)
+
+        start_time = time.time()
+        try:
+            response = self.adapter.send(request, **kwargs)
+        except requests.exceptions.Timeout:
+            self.controller.record(time.time() - start_time, None)
+            raise
+        self.controller.record(time.time() - start_time, response.status_code)
+        return response
+
+    def close(self):
+        self.adapter.close()
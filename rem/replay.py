@@ -0,0 +1,108 @@
+import datetime
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from rem import utils
+from rem.archive import HtmlArchive
+from rem.config import settings as default_settings
+from rem.logger import log
+from rem.otodom import Otodom
+
+SavedPage = Tuple[datetime.datetime, str]
+
+# Scraper of the worker process, set up once by `_init_worker`
+_scraper: Optional[Otodom] = None
+
+
+def iter_saved_listings(source: str) -> Iterator[SavedPage]:
+    """
+    Yield `(fetched_at, html)` of every listing saved in `source`, which is
+    either an `HtmlArchive` directory (newest copy of every url) or a
+    directory of `.html` files written with SAVE_HTMLS_FORMAT=files.
+    Search pages are skipped.
+    """
+    if os.path.isfile(os.sep.join([source, "index.sqlite"])):
+        archive = HtmlArchive(source)
+        try:
+            for url, fetched_at, html in archive.latest():
+                if not utils.is_search_url(url):
+                    yield fetched_at, html
+        finally:
+            archive.close()
+        return
+
+    for file_name in sorted(os.listdir(source)):
+        # Search pages are saved under their query, e.g. "warszawa?page=1"
+        if not file_name.endswith(".html") or "?" in file_name:
+            continue
+        path = os.sep.join([source, file_name])
+        fetched_at = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        with open(path) as f:
+            yield fetched_at, f.read()
+
+
+def _init_worker(replay_settings) -> None:
+    global _scraper
+    _scraper = Otodom(replay_settings, offline=True)
+
+
+def _extract_listings(pages: List[SavedPage]) -> List[Dict]:
+    listings = []
+    for fetched_at, html in pages:
+        record = _scraper.extract_record(html)
+        record["created_at"] = str(fetched_at)
+        listings.append(record)
+    return listings
+
+
+def _chunks(pages: Iterator[SavedPage], size: int) -> Iterator[List]:
+    while chunk := list(islice(pages, size)):
+        yield chunk
+
+
+def replay(
+    source: str,
+    new_settings=None,
+    workers: Optional[int] = None,
+    chunk_size: int = 16,
+) -> pd.DataFrame:
+    """
+    Run the extractors over the listings saved in `source` without sending
+    any request, spread over `workers` processes (all cores by default).
+    `created_at` is the time the page was downloaded, rows keep the order
+    the pages were saved in.
+    """
+    replay_settings = (new_settings or default_settings).copy(
+        update={
+            "LOAD_FROM_DATA": False,
+            "USE_GOOGLE_MAPS_API": False,
+            "SAVE_HTMLS": False,
+        }
+    )
+    if workers is None:
+        workers = os.cpu_count()
+    log.info(f"Replaying listings saved in {source} with {workers} workers")
+
+    listings: List[Dict] = []
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(replay_settings,),
+    ) as executor:
+        # Only a few chunks per worker are read ahead, so the saved pages
+        # are never all held in memory
+        for chunk in _chunks(iter_saved_listings(source), chunk_size):
+            pending.append(executor.submit(_extract_listings, chunk))
+            if len(pending) >= 2 * workers:
+                listings.extend(pending.popleft().result())
+        while pending:
+            listings.extend(pending.popleft().result())
+
+    log.info(f"Replayed {len(listings)} listings")
+    return pd.DataFrame(listings).reset_index(drop=True)
@@ -0,0 +1,89 @@
+import os
+import re
+import sqlite3
+from typing import Iterable, Optional, Set
+from urllib.parse import urlparse
+
+# Listing urls end with the id of the listing, e.g. ".../mieszkanie-ID4dG6i"
+LISTING_ID_PATTERN = re.compile(r"-(ID[0-9A-Za-z]+)(?:\.html)?$")
+
+
+def listing_id_from_url(url: str) -> Optional[str]:
+    match = LISTING_ID_PATTERN.search(urlparse(url).path)
+    return match.group(1) if match else None
+
+
+class SeenListings:
+    """
+    Urls of the listings already scraped, and the listing ids in them, so a
+    listing is recognised under a different url as well. Lookups go through
+    in-memory sets. With a `path`, the listings passed to `save` are also
+    written to an SQLite file there and loaded from it on the next start,
+    without reading the data itself.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.urls: Set[str] = set()
+        self.listing_ids: Set[str] = set()
+        self._index: Optional[sqlite3.Connection] = None
+
+        if path and os.path.isfile(path):
+            for url, listing_id in self._connect().execute(
+                "SELECT url, listing_id FROM seen"
+            ):
+                self.urls.add(url)
+                if listing_id:
+                    self.listing_ids.add(listing_id)
+
+    def _connect(self) -> sqlite3.Connection:
+        # The file is only created once there is a listing to remember
+        if self._index is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._index = sqlite3.connect(self.path, check_same_thread=False)
+            with self._index:
+                self._index.execute(
+                    "CREATE TABLE IF NOT EXISTS seen "
+                    "(url TEXT PRIMARY KEY, listing_id TEXT)"
+                )
+        return self._index
+
+    def add(self, url: str) -> None:
+        self.add_many([url])
+
+    def add_many(self, urls: Iterable[str]) -> None:
+        """Remember `urls` in memory only, see `save`."""
+        for url in urls:
+            self.urls.add(url)
+            listing_id = listing_id_from_url(url)
+            if listing_id:
+                self.listing_ids.add(listing_id)
+
+    def save(self, urls: Iterable[str]) -> None:
+        """
+        Remember `urls` and write them to the file at `path` in a single
+        transaction, once the listings are in the data. Urls already
+        remembered in memory are written as well.
+        """
+        urls = list(urls)
+        self.add_many(urls)
+        if self.path and urls:
+            with self._connect() as index:
+                index.executemany(
+                    "INSERT OR IGNORE INTO seen VALUES (?,?)",
+                    [(url, listing_id_from_url(url)) for url in urls],
+                )
+
+    def __contains__(self, url: str) -> bool:
+        if url in self.urls:
+            return True
+        listing_id = listing_id_from_url(url)
+        return listing_id is not None and listing_id in self.listing_ids
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.close()
+            self._index = None
@@ -0,0 +1,113 @@
+import os
+import re
+import shutil
+from typing import List, Optional
+
+import pandas as pd
+
+from rem.logger import log
+from rem.storage import (
+    DATA_FORMATS,
+    data_file_path,
+    merge_data,
+    write_data,
+)
+
+
+class DataSink:
+    """
+    Saves the data of a scrape to `<directory>/<file_name>.csv` (or
+    `.parquet`, see `rem.storage`). New rows are appended as they come in:
+    each batch becomes a part file of its own in `<file_name>.parts`, so
+    only the new rows are written. `compact` merges everything into the
+    data file at the end.
+
+    Part files and the data file are written under a temporary name and
+    renamed into place. A crash therefore never leaves a torn file, and
+    `recover` merges the parts that were left behind.
+    """
+
+    def __init__(
+        self, directory: str, file_name: str, data_format: str = "csv"
+    ):
+        self.directory = directory
+        self.data_format = data_format
+        self.path = data_file_path(directory, file_name, data_format)
+        self._extension = DATA_FORMATS[data_format]
+        self._part_name_pattern = re.compile(
+            rf"^part-(\d+)\.{self._extension}$"
+        )
+        self.parts_directory = os.sep.join([directory, f"{file_name}.parts"])
+        # The parts already merged into the data file being written
+        self.compacted_parts_directory = f"{self.parts_directory}.compacted"
+        self._next_part = len(self.part_paths())
+
+    def part_paths(self) -> List[str]:
+        if not os.path.isdir(self.parts_directory):
+            return []
+        parts = sorted(
+            (int(match.group(1)), file_name)
+            for file_name in os.listdir(self.parts_directory)
+            if (match := self._part_name_pattern.match(file_name))
+        )
+        return [
+            os.sep.join([self.parts_directory, file_name])
+            for _, file_name in parts
+        ]
+
+    def append(self, rows: pd.DataFrame) -> None:
+        if rows.empty:
+            return
+        os.makedirs(self.parts_directory, exist_ok=True)
+        part_path = os.sep.join(
+            [
+                self.parts_directory,
+                f"part-{self._next_part:05d}.{self._extension}",
+            ]
+        )
+        log.info(f"Saving {len(rows)} new rows to {part_path}...")
+        write_data(rows, part_path, self.data_format)
+        self._next_part += 1
+
+    def compact(
+        self, data: Optional[pd.DataFrame] = None, parts_only: bool = False
+    ) -> None:
+        """
+        Replace the data file with `data`, which has to include the appended
+        rows, or by default with the data file and all parts merged (only
+        the parts with `parts_only`), then drop the parts. Merged files are
+        streamed a chunk at a time, not loaded.
+        """
+        log.info(f"Saving data to {self.path}...")
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Written in full before the parts are set aside, `recover` puts it
+        # in place if interrupted after that
+        temporary_path = f"{self.path}.tmp"
+        if data is not None:
+            write_data(data, temporary_path, self.data_format)
+        else:
+            paths = self.part_paths()
+            if not parts_only and os.path.isfile(self.path):
+                paths.insert(0, self.path)
+            if paths:
+                merge_data(paths, temporary_path, self.data_format)
+            else:
+                write_data(pd.DataFrame(), temporary_path, self.data_format)
+        if os.path.isdir(self.parts_directory):
+            os.replace(self.parts_directory, self.compacted_parts_directory)
+        os.replace(temporary_path, self.path)
+        shutil.rmtree(self.compacted_parts_directory, ignore_errors=True)
+        self._next_part = 0
+
+    def recover(self) -> None:
+        """Finish saving the data of a scrape that was interrupted."""
+        temporary_path = f"{self.path}.tmp"
+        if os.path.isdir(self.compacted_parts_directory):
+            # Interrupted while compacting, the merged data is complete
+            if os.path.isfile(temporary_path):
+                os.replace(temporary_path, self.path)
+            shutil.rmtree(self.compacted_parts_directory)
+        if self.part_paths():
+            log.warning(f"Merging rows left in {self.parts_directory}")
+            self.compact()
@@ -0,0 +1,196 @@
+import os
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+from rem.columns import COLUMN_TYPES
+from rem.logger import log
+from rem.store import ListingStore
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# File extension of every supported data format
+DATA_FORMATS = {"csv": "csv", "parquet": "parquet", "sqlite": "sqlite"}
+
+# Rows read at a time by `merge_data`
+MERGE_CHUNK_SIZE = 10000
+
+
+def resolve_data_format(data_format: str) -> str:
+    """
+    Return `data_format` if it can be read and written, otherwise fall back
+    to "csv". Parquet needs pyarrow (`pip install rem[parquet]`).
+    """
+    if data_format not in DATA_FORMATS:
+        raise ValueError(
+            f"Unknown data format {data_format}, "
+            f"expected one of {', '.join(DATA_FORMATS)}"
+        )
+    if data_format == "parquet" and pyarrow is None:
+        log.warning("pyarrow is not installed, saving data as csv")
+        return "csv"
+    return data_format
+
+
+def data_file_path(
+    directory: str, file_name: str, data_format: str = "csv"
+) -> str:
+    return os.sep.join([directory, f"{file_name}.{DATA_FORMATS[data_format]}"])
+
+
+def read_data(
+    path: str,
+    data_format: str = "csv",
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Data saved by `write_data`. Only `columns` are read if given, columns
+    missing from the file are skipped. Parquet files and SQLite databases
+    don't even read the other columns from disk.
+    """
+    if data_format == "sqlite":
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        store = ListingStore(path)
+        try:
+            return store.read(columns)
+        finally:
+            store.close()
+
+    if data_format == "parquet":
+        if columns is not None:
+            names = pyarrow.parquet.read_schema(path).names
+            columns = [column for column in columns if column in names]
+        return pd.read_parquet(path, columns=columns)
+
+    if columns is None:
+        return pd.read_csv(path, index_col=0)
+    # The index is the first column
+    return pd.read_csv(
+        path,
+        index_col=0,
+        usecols=lambda column: column in columns or column == "Unnamed: 0",
+    )
+
+
+def write_data(
+    data: pd.DataFrame, path: str, data_format: str = "csv"
+) -> None:
+    """
+    Write `data` to `path` through a temporary file that replaces it only
+    once fully on disk, so `path` is never left half written. SQLite
+    databases are updated in place instead, in a single transaction (see
+    `ListingStore`).
+    """
+    if data_format == "sqlite":
+        store = ListingStore(path)
+        try:
+            store.upsert(data)
+        finally:
+            store.close()
+        return
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        if data_format == "parquet":
+            pyarrow.parquet.write_table(
+                _arrow_table(data), f, compression="zstd"
+            )
+        else:
+            f.write(data.to_csv().encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def merge_data(
+    paths: Sequence[str],
+    path: str,
+    data_format: str = "csv",
+    chunk_size: int = MERGE_CHUNK_SIZE,
+) -> None:
+    """
+    Write the rows of the data files at `paths`, in order and renumbered,
+    to `path` like `write_data` does. Files are read `chunk_size` rows at
+    a time, so the merged data is never all in memory. Columns missing from
+    some files are left empty there.
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        if data_format == "parquet":
+            _merge_parquet(paths, f, chunk_size)
+        else:
+            _merge_csv(paths, f, chunk_size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def _merge_csv(paths: Sequence[str], f, chunk_size: int) -> None:
+    columns: List[str] = []
+    for path in paths:
+        for column in pd.read_csv(path, index_col=0, nrows=0).columns:
+            if column not in columns:
+                columns.append(column)
+
+    f.write(pd.DataFrame(columns=columns).to_csv().encode("utf-8"))
+    rows = 0
+    for path in paths:
+        for chunk in pd.read_csv(path, index_col=0, chunksize=chunk_size):
+            chunk = chunk.reindex(columns=columns)
+            chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+            f.write(chunk.to_csv(header=False).encode("utf-8"))
+            rows += len(chunk)
+
+
+def _merge_parquet(paths: Sequence[str], f, chunk_size: int) -> None:
+    # Declared columns have their types, the others the first type of
+    # theirs that isn't only missing values
+    fields = {}
+    for path in paths:
+        for field in pyarrow.parquet.read_schema(path):
+            if field.name.startswith("__index_level_"):
+                continue
+            if field.name in COLUMN_TYPES:
+                field = field.with_type(_arrow_type(field.name))
+            if field.name not in fields or fields[field.name].type == "null":
+                fields[field.name] = field
+    schema = pyarrow.schema(list(fields.values()))
+
+    with pyarrow.parquet.ParquetWriter(
+        f, schema, compression="zstd"
+    ) as writer:
+        for path in paths:
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches(
+                batch_size=chunk_size, columns=schema.names
+            ):
+                chunk = batch.to_pandas().reindex(columns=schema.names)
+                writer.write_table(
+                    pyarrow.Table.from_pandas(
+                        chunk, schema=schema, preserve_index=False
+                    )
+                )
+
+
+def _arrow_type(column: str) -> "pyarrow.DataType":
+    return {
+        str: pyarrow.string(),
+        float: pyarrow.float64(),
+        int: pyarrow.int64(),
+    }[COLUMN_TYPES[column]]
+
+
+def _arrow_table(data: pd.DataFrame) -> "pyarrow.Table":
+    # Columns of the data are written with their declared types, whatever
+    # pandas made of the values, e.g. an object column of only missing
+    # prices. Other columns keep the types inferred from their values.
+    schema = pyarrow.Schema.from_pandas(data)
+    for index, field in enumerate(schema):
+        if field.name in COLUMN_TYPES:
+            schema = schema.set(
+                index, field.with_type(_arrow_type(field.name))
+            )
+    return pyarrow.Table.from_pandas(data, schema=schema)
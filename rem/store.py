@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from rem.columns import COLUMN_TYPES
+
+# Columns looked up by queries
+INDEXED_COLUMNS = ("url", "created_at", "price")
+
+SQL_TYPES = {str: "TEXT", float: "REAL", int: "INTEGER"}
+
+
+def _quote(column: str) -> str:
+    # Some columns have spaces in their names, e.g. "distance_to center"
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _column_type(column: pd.Series) -> str:
+    # Of a column that isn't declared in `rem.columns`
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(
+        column
+    ):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(column):
+        return "REAL"
+    return "TEXT"
+
+
+class ListingStore:
+    """
+    Listings kept in an SQLite database, one row per listing: a listing
+    saved again (same `unique_id`) is updated in place. Listings without
+    a `unique_id` are always added. The table has the columns of
+    `rem.columns` with their declared types from the start, other columns
+    are added as rows bring them. The database is in WAL mode, so it can
+    be queried while a scrape writes to it. `unique_id`, `url`,
+    `created_at` and `price` are indexed.
+
+    It can be used as the sink of a scrape: rows are upserted as they are
+    appended, so compacting is a no-op.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            columns = ", ".join(
+                f"{_quote(column)} {SQL_TYPES[column_type]}"
+                for column, column_type in COLUMN_TYPES.items()
+            )
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS listings ({columns})"
+            )
+            # Databases of older versions only had the columns of their rows
+            existing = set(self.columns())
+            for column, column_type in COLUMN_TYPES.items():
+                if column not in existing:
+                    self._db.execute(
+                        f"ALTER TABLE listings ADD COLUMN {_quote(column)} "
+                        f"{SQL_TYPES[column_type]}"
+                    )
+            self._db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS listings_unique_id "
+                "ON listings (unique_id)"
+            )
+            for column in INDEXED_COLUMNS:
+                self._db.execute(
+                    f"CREATE INDEX IF NOT EXISTS listings_{column} "
+                    f"ON listings ({_quote(column)})"
+                )
+
+    def columns(self) -> List[str]:
+        return [
+            row[1] for row in self._db.execute("PRAGMA table_info(listings)")
+        ]
+
+    def upsert(self, rows: pd.DataFrame) -> None:
+        """Add `rows` in a single transaction, updating known listings."""
+        if rows.empty:
+            return
+        columns = list(rows.columns)
+        # Missing values are stored as NULL, numpy scalars as Python ones
+        values = rows.astype(object).where(rows.notna(), None)
+        if "unique_id" in columns:
+            values["unique_id"] = [
+                None if unique_id is None else int(unique_id)
+                for unique_id in values["unique_id"]
+            ]
+
+        quoted = [_quote(column) for column in columns]
+        query = (
+            f"INSERT INTO listings ({', '.join(quoted)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+        if "unique_id" in columns:
+            updates = ", ".join(
+                f"{column}=excluded.{column}" for column in quoted
+            )
+            query += f" ON CONFLICT (unique_id) DO UPDATE SET {updates}"
+
+        with self._lock, self._db:
+            self._add_columns(rows)
+            self._db.executemany(query, values.itertuples(index=False))
+
+    def _add_columns(self, rows: pd.DataFrame) -> None:
+        existing = set(self.columns())
+        for column in rows.columns:
+            if column in existing:
+                continue
+            self._db.execute(
+                f"ALTER TABLE listings ADD COLUMN {_quote(column)} "
+                f"{_column_type(rows[column])}"
+            )
+
+    def read(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """All listings, in the order they were first saved."""
+        existing = self.columns()
+        if columns is not None:
+            existing = [column for column in columns if column in existing]
+        selected = ", ".join(_quote(column) for column in existing)
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {selected} FROM listings ORDER BY rowid", self._db
+            )
+
+    def get(self, unique_id: int) -> Optional[Dict]:
+        data = self.query(
+            "SELECT * FROM listings WHERE unique_id=?", unique_id
+        )
+        return data.iloc[0].to_dict() if len(data) else None
+
+    def query(self, sql: str, *parameters) -> pd.DataFrame:
+        """Run an ad-hoc query against the `listings` table."""
+        with self._lock:
+            return pd.read_sql_query(sql, self._db, params=parameters)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM listings"
+            ).fetchone()[0]
+
+    # The interface of `rem.sink.DataSink`
+    def append(self, rows: pd.DataFrame) -> None:
+        self.upsert(rows)
+
+    def compact(
+        self, data: Optional[pd.DataFrame] = None, parts_only: bool = False
+    ) -> None:
+        pass
+
+    def recover(self) -> None:
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
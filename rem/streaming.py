@@ -0,0 +1,228 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Union
+
+from bs4.builder import HTMLParserTreeBuilder
+
+from rem.utils import INDEXED_ATTRIBUTES, ListingIndex
+
+_TREE_BUILDER = HTMLParserTreeBuilder()
+# Tags closed as soon as they are opened, as BeautifulSoup does
+EMPTY_ELEMENT_TAGS = frozenset(_TREE_BUILDER.empty_element_tags)
+# Text inside these tags is not part of the text of the enclosing tags
+NON_TEXT_TAGS = frozenset(_TREE_BUILDER.string_containers)
+# Tags the extractors look up by name
+INDEXED_TAGS = ("meta", "link", "a", "h3")
+
+Node = Union[str, "StreamedElement"]
+
+
+class StreamedElement:
+    """
+    The part of a tag the listing extractors read, with the same names as
+    in BeautifulSoup: `name`, `attrs`, `get`, `contents` (only kept for
+    aria-labelled tags and their children), `get_text` (only kept for tags
+    looked up by name or by data-cy, and feature list items),
+    `findNextSiblings` (only the `ul` siblings of `h3` tags) and
+    `findAll("li")` (only on those `ul` tags).
+    """
+
+    def __init__(self, name: str, attrs: Dict[str, str]):
+        self.name = name
+        self.attrs = attrs
+        self.contents: List[Node] = []
+        self.next_siblings: List["StreamedElement"] = []
+        self.items: List["StreamedElement"] = []
+        self._text: List[str] = []
+
+    def get(self, key: str, default=None):
+        return self.attrs.get(key, default)
+
+    @property
+    def children(self):
+        return iter(self.contents)
+
+    def get_text(self) -> str:
+        return "".join(self._text)
+
+    getText = get_text
+    text = property(get_text)
+
+    def findNextSiblings(self) -> List["StreamedElement"]:
+        return self.next_siblings
+
+    def findAll(self, name: str) -> List["StreamedElement"]:
+        return self.items if name == "li" else []
+
+    def __repr__(self) -> str:
+        return f"<{self.name} {self.attrs}>"
+
+
+class _Frame:
+    __slots__ = (
+        "name",
+        "element",
+        "capture_depth",
+        "collects_text",
+        "h3s",
+        "is_feature_list",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.element: Optional[StreamedElement] = None
+        self.capture_depth = 0
+        self.collects_text = False
+        self.h3s: List[StreamedElement] = []
+        self.is_feature_list = False
+
+
+class StreamedListing(ListingIndex):
+    """
+    `ListingIndex` filled from a single streaming pass over the raw HTML,
+    without building a tree. Only the elements the `Otodom` extractors read
+    are kept (see `StreamedElement`), so it can be passed to them in place
+    of a soup and gives the same record. The one difference is a detail
+    value wrapped in another tag: a soup gives that tag, here it is an
+    element without contents.
+    """
+
+    def __init__(self, html: str):
+        self.tags = {name: [] for name in INDEXED_TAGS}
+        self.attributes = {}
+        self.additional_features = None
+        _ListingStreamParser(self).feed_all(html)
+
+
+class _ListingStreamParser(HTMLParser):
+    """
+    Mimics what BeautifulSoup with "html.parser" would build: tags in
+    `EMPTY_ELEMENT_TAGS` are closed immediately, an end tag closes the most
+    recent open tag with that name (and everything opened after it) and
+    stray end tags are ignored.
+    """
+
+    def __init__(self, listing: StreamedListing):
+        super().__init__(convert_charrefs=True)
+        self.listing = listing
+        self.stack: List[_Frame] = [_Frame("[document]")]
+        self.text_collectors: List[StreamedElement] = []
+        self.feature_lists: List[StreamedElement] = []
+        self.non_text_depth = 0
+        self.closed_empty_elements: List[str] = []
+        self._last_was_text = False
+
+    def feed_all(self, html: str) -> None:
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        attrs = {key: "" if value is None else value for key, value in attrs}
+        parent = self.stack[-1]
+        frame = _Frame(tag)
+        element = None
+
+        if tag in INDEXED_TAGS:
+            element = StreamedElement(tag, attrs)
+            self.listing.tags[tag].append(element)
+            if tag != "h3":
+                frame.collects_text = True
+        for attribute in INDEXED_ATTRIBUTES:
+            value = attrs.get(attribute)
+            if value is not None:
+                element = element or StreamedElement(tag, attrs)
+                self.listing.attributes.setdefault(
+                    (attribute, value), []
+                ).append(element)
+                if attribute == "aria-label":
+                    frame.capture_depth = 2
+                else:
+                    frame.collects_text = True
+
+        if parent.capture_depth:
+            element = element or StreamedElement(tag, attrs)
+            parent.element.contents.append(element)
+            frame.capture_depth = max(
+                frame.capture_depth, parent.capture_depth - 1
+            )
+        if tag == "ul" and parent.h3s:
+            element = element or StreamedElement(tag, attrs)
+            for h3 in parent.h3s:
+                h3.next_siblings.append(element)
+            frame.is_feature_list = True
+        if tag == "li" and self.feature_lists:
+            element = element or StreamedElement(tag, attrs)
+            for feature_list in self.feature_lists:
+                feature_list.items.append(element)
+            frame.collects_text = True
+        if tag == "h3":
+            parent.h3s.append(element)
+
+        if "rel" in attrs and element is not None:
+            # Multi-valued in BeautifulSoup
+            attrs["rel"] = attrs["rel"].split()
+
+        frame.element = element
+        self._last_was_text = False
+        self.stack.append(frame)
+        if frame.collects_text:
+            self.text_collectors.append(element)
+        if frame.is_feature_list:
+            self.feature_lists.append(element)
+        if tag in NON_TEXT_TAGS:
+            self.non_text_depth += 1
+
+        if tag in EMPTY_ELEMENT_TAGS and not self_closing:
+            self._pop_to(tag)
+            self.closed_empty_elements.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_empty_elements:
+            self.closed_empty_elements.remove(tag)
+            return
+        self._pop_to(tag)
+
+    def _pop_to(self, tag: str) -> None:
+        for position in range(len(self.stack) - 1, 0, -1):
+            if self.stack[position].name == tag:
+                break
+        else:
+            return
+
+        while len(self.stack) > position:
+            frame = self.stack.pop()
+            if frame.collects_text:
+                self.text_collectors.pop()
+            if frame.is_feature_list:
+                self.feature_lists.pop()
+            if frame.name in NON_TEXT_TAGS:
+                self.non_text_depth -= 1
+        self._last_was_text = False
+
+    def handle_data(self, data):
+        parent = self.stack[-1]
+        if parent.capture_depth:
+            contents = parent.element.contents
+            if self._last_was_text:
+                contents[-1] += data
+            else:
+                contents.append(data)
+        self._last_was_text = True
+
+        if not self.non_text_depth:
+            for element in self.text_collectors:
+                element._text.append(data)
+
+    def handle_comment(self, data):
+        # Comments are nodes of their own, but not part of the text
+        parent = self.stack[-1]
+        if parent.capture_depth:
+            parent.element.contents.append(data)
+        self._last_was_text = False
+
+
+def parse_listing(html: str) -> StreamedListing:
+    return StreamedListing(html)
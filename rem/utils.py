@@ -1,14 +1,82 @@
 import os.path
-from typing import TextIO
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, TextIO, Tuple
+from urllib.parse import urlparse
 
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from bs4.builder import builder_registry
 
 from rem.logger import log
+from rem.storage import data_file_path, read_data, write_data
+
+# Attributes whose values are indexed by `ListingIndex`
+INDEXED_ATTRIBUTES = ("aria-label", "data-cy")
+
+
+class ListingIndex:
+    """
+    Tags of a parsed page grouped by name and by the value of the
+    `INDEXED_ATTRIBUTES`, in document order. It is built in one walk over
+    the tree, so the extractors look elements up instead of each searching
+    the whole document again.
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self.tags: Dict[str, List[Tag]] = defaultdict(list)
+        self.attributes: Dict[Tuple[str, str], List[Tag]] = defaultdict(list)
+        # Filled in by `Otodom.resolve_additional_features` on first use
+        self.additional_features: Optional[FrozenSet[str]] = None
+        for element in soup.descendants:
+            if not isinstance(element, Tag):
+                continue
+            self.tags[element.name].append(element)
+            for attribute in INDEXED_ATTRIBUTES:
+                value = element.attrs.get(attribute)
+                if isinstance(value, str):
+                    self.attributes[(attribute, value)].append(element)
+
+    def find_all(self, name: str) -> List[Tag]:
+        return self.tags.get(name, [])
+
+    def find_all_by_attribute(self, attribute: str, value: str) -> List[Tag]:
+        return self.attributes.get((attribute, value), [])
+
+    def canonical_url(self) -> Optional[str]:
+        for link in self.find_all("link"):
+            if "canonical" in (link.get("rel") or []):
+                return link.get("href")
+        return None
+
+
+def get_listing_index(soup: BeautifulSoup) -> ListingIndex:
+    """
+    Index of `soup`, built on first use and kept on the soup. It is read
+    through `__dict__`, attribute access on a bs4 tag would search the tree
+    for a child tag with that name instead. Listings parsed without a tree
+    are their own index.
+    """
+    if isinstance(soup, ListingIndex):
+        return soup
+    index = soup.__dict__.get("_listing_index")
+    if index is None:
+        index = ListingIndex(soup)
+        soup.__dict__["_listing_index"] = index
+    return index
+
+
+def _find_all(soup, soup_filter) -> List[Tag]:
+    if len(soup_filter) == 1:
+        ((attribute, value),) = soup_filter.items()
+        if attribute in INDEXED_ATTRIBUTES and isinstance(value, str):
+            return get_listing_index(soup).find_all_by_attribute(
+                attribute, value
+            )
+    return soup.find_all(attrs=soup_filter)
 
 
 def _extract_divs(soup, soup_filter, what: str):
-    divs = soup.find_all(attrs=soup_filter)
+    divs = _find_all(soup, soup_filter)
 
     if len(divs) > 1:
         log_wrong_number(len(divs), 1, what)
@@ -32,10 +100,10 @@ def log_unexpected(unexpected: str, where: str) -> None:
     log.error(f"Unexpected {unexpected} encountered in {where} in the listing")
 
 
-def load_data(file_name, data_dir="data"):
+def load_data(file_name, data_dir="data", columns=None, data_format="csv"):
     try:
-        data_path = os.sep.join([data_dir, f"{file_name}.csv"])
-        df = pd.read_csv(data_path)
+        data_path = data_file_path(data_dir, file_name, data_format)
+        df = read_data(data_path, data_format, columns)
         log.info(f"Loading existing data containing {len(df)} records...")
         return df
     except FileNotFoundError:
@@ -43,14 +111,16 @@ def load_data(file_name, data_dir="data"):
         return pd.DataFrame()
 
 
-def save_data(data: pd.DataFrame, file_name, data_dir="data"):
-    data_path = os.sep.join([data_dir, f"{file_name}.csv"])
+def save_data(
+    data: pd.DataFrame, file_name, data_dir="data", data_format="csv"
+):
+    data_path = data_file_path(data_dir, file_name, data_format)
     log.info(f"Saving data to {data_path}...")
 
     if os.path.isfile(data_path):
         log.warning("Overwriting data")
 
-    data.to_csv(data_path)
+    write_data(data, data_path, data_format)
 
 
 def get_html_doc(response):
@@ -58,6 +128,23 @@ def get_html_doc(response):
     return page
 
 
-def get_soup(html_doc: TextIO):
-    soup = BeautifulSoup(html_doc, "html.parser")
+def get_soup(html_doc: TextIO, parser: str = "html.parser"):
+    soup = BeautifulSoup(html_doc, parser)
     return soup
+
+
+def resolve_html_parser(parser: str) -> str:
+    """
+    Return `parser` if BeautifulSoup has a tree builder for it installed,
+    otherwise fall back to the built-in "html.parser".
+    """
+    if builder_registry.lookup(parser) is None:
+        log.warning(
+            f"HTML parser {parser} is not available, using html.parser"
+        )
+        return "html.parser"
+    return parser
+
+
+def is_search_url(url: str) -> bool:
+    return urlparse(url).path.startswith("/pl/oferty/")
@@ -0,0 +1,26 @@
+import os
+from typing import Iterator
+
+import pytest
+
+import rem.otodom
+from rem.config import get_settings
+from rem.otodom import Otodom
+
+
+def read_resource(file_name: str) -> str:
+    path = os.sep.join(["tests", "resources", file_name])
+    with open(path, encoding="utf-8") as fp:
+        return fp.read()
+
+
+@pytest.fixture(scope="module")
+def scraper() -> Iterator[Otodom]:
+    # Otodom replaces the settings of rem.otodom with the ones it's given,
+    # they are restored once the module's tests are done
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(rem.otodom, "settings", rem.otodom.settings)
+        yield Otodom(
+            get_settings().copy(update={"LOAD_FROM_DATA": False}),
+            offline=True,
+        )
@@ -0,0 +1,76 @@
+import datetime
+import os
+
+import pytest
+
+from rem.archive import HtmlArchive
+
+
+@pytest.fixture
+def archive(tmp_path) -> HtmlArchive:
+    archive = HtmlArchive(str(tmp_path))
+    yield archive
+    archive.close()
+
+
+def test_pages_are_read_back(archive) -> None:
+    archive.write("https://www.otodom.pl/pl/oferta/a", "<html>a</html>")
+    archive.write("https://www.otodom.pl/pl/oferta/b", "<html>ą ę</html>")
+
+    assert (
+        archive.read("https://www.otodom.pl/pl/oferta/a") == "<html>a</html>"
+    )
+    assert (
+        archive.read("https://www.otodom.pl/pl/oferta/b") == "<html>ą ę</html>"
+    )
+    assert archive.read("https://www.otodom.pl/pl/oferta/c") is None
+    assert "https://www.otodom.pl/pl/oferta/a" in archive
+    assert len(archive) == 2
+
+
+def test_pages_with_the_same_name_do_not_collide(archive) -> None:
+    archive.write("https://www.otodom.pl/pl/oferta/a/123", "<html>1</html>")
+    archive.write("https://www.otodom.pl/pl/oferta/b/123", "<html>2</html>")
+
+    assert archive.read("https://www.otodom.pl/pl/oferta/a/123") == (
+        "<html>1</html>"
+    )
+    assert archive.read("https://www.otodom.pl/pl/oferta/b/123") == (
+        "<html>2</html>"
+    )
+
+
+def test_newest_copy_is_read(archive) -> None:
+    url = "https://www.otodom.pl/pl/oferta/a"
+    archive.write(url, "<html>v1</html>", datetime.datetime(2022, 1, 1))
+    archive.write(url, "<html>v2</html>", datetime.datetime(2022, 2, 1))
+
+    assert archive.read(url) == "<html>v2</html>"
+    assert archive.read(url, at=datetime.datetime(2022, 1, 15)) == (
+        "<html>v1</html>"
+    )
+    assert archive.read(url, at=datetime.datetime(2021, 1, 1)) is None
+
+
+def test_segments_are_rolled_over(tmp_path) -> None:
+    archive = HtmlArchive(str(tmp_path), segment_size=1000)
+    pages = {
+        f"https://www.otodom.pl/pl/oferta/{i}": os.urandom(300).hex()
+        for i in range(10)
+    }
+    for url, html in pages.items():
+        archive.write(url, html)
+        # Reading maps the segment that is still being written to
+        assert archive.read(url) == html
+
+    assert os.path.isfile(archive.segment_path(1))
+    assert {url: html for url, _, html in archive} == pages
+    archive.close()
+
+    reopened_archive = HtmlArchive(str(tmp_path), segment_size=1000)
+    reopened_archive.write("https://www.otodom.pl/pl/oferta/new", "<html>")
+    assert len(reopened_archive) == 11
+    assert all(
+        reopened_archive.read(url) == html for url, html in pages.items()
+    )
+    reopened_archive.close()
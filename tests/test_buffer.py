@@ -0,0 +1,65 @@
+import math
+
+import pandas as pd
+
+from rem.buffer import RowBuffer
+
+
+def test_row_buffer_aligns_columns() -> None:
+    buffer = RowBuffer()
+    buffer.append({"url": "a", "price": 100})
+    buffer.append(pd.Series({"url": "b", "floor": 2}))
+    buffer.append({"price": 300, "url": "c"})
+
+    data = buffer.to_frame()
+
+    assert len(buffer) == 3
+    assert list(data.columns) == ["url", "price", "floor"]
+    assert list(data["url"]) == ["a", "b", "c"]
+    assert data["price"].dtype == float
+    assert math.isnan(data.loc[1, "price"])
+    assert data.loc[2, "price"] == 300
+
+
+def test_row_buffer_gives_the_same_data_as_append() -> None:
+    records = [
+        pd.Series({"url": "a", "price": 100, "market_type": None}),
+        pd.Series({"url": "b", "price": 200, "market_type": "wtórny"}),
+        pd.Series({"url": "c", "floor": 1}),
+    ]
+    expected = pd.DataFrame({"url": []})
+    for record in records:
+        expected = expected.append(record, ignore_index=True)
+    buffer = RowBuffer()
+    for record in records:
+        buffer.append(record)
+
+    data = buffer.flush_into(pd.DataFrame({"url": []}))
+
+    pd.testing.assert_frame_equal(data, expected)
+    assert len(buffer) == 0
+
+
+def test_flush_into_appends_to_existing_data() -> None:
+    buffer = RowBuffer()
+    buffer.append({"url": "b", "price": 200})
+    data = pd.DataFrame({"url": ["a"], "price": [100]})
+
+    data = buffer.flush_into(data)
+
+    assert list(data["url"]) == ["a", "b"]
+    assert list(data["price"]) == [100, 200]
+    assert buffer.flush_into(data) is data
+
+
+def test_row_buffer_gives_declared_columns_their_types() -> None:
+    buffer = RowBuffer()
+    buffer.append({"url": "a", "price": None, "unique_id": 1, "extra": None})
+    buffer.append({"url": "b", "price": None, "extra": None})
+
+    data = buffer.to_frame()
+
+    assert data["price"].dtype == float
+    assert data["unique_id"].dtype == float
+    assert data["url"].dtype == object
+    assert data["extra"].dtype == object
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+from requests import Response
+from requests.adapters import BaseAdapter
+
+import rem.cache
+from rem.cache import CompressedCache, get_compressed_session
+
+
+class PageAdapter(BaseAdapter):
+    """Serves `body` for every url, or `body` + url when `unique` is set."""
+
+    def __init__(self, body: bytes, unique: bool = False):
+        super().__init__()
+        self.body = body
+        self.unique = unique
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.status_code = 200
+        response._content = self.body
+        if self.unique:
+            response._content += request.url.encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def get_session(tmp_path, adapter, **kwargs):
+    session = get_compressed_session(
+        os.sep.join([str(tmp_path), "cache"]), **kwargs
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+def count_rows(cache: CompressedCache, table_name: str) -> int:
+    with cache.responses.connection() as con:
+        return con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+@pytest.mark.parametrize("zstandard", [rem.cache.zstandard, None])
+def test_response_roundtrip(tmp_path, monkeypatch, zstandard) -> None:
+    monkeypatch.setattr(rem.cache, "zstandard", zstandard)
+    adapter = PageAdapter(b"<html>" + b"listing " * 1000 + b"</html>")
+    session = get_session(tmp_path, adapter)
+
+    response = session.get("https://www.otodom.pl/pl/oferta/1")
+    cached_response = session.get("https://www.otodom.pl/pl/oferta/1")
+
+    assert adapter.requests == 1
+    assert not response.from_cache
+    assert cached_response.from_cache
+    assert cached_response.content == response.content
+    assert cached_response.text == response.text
+    assert cached_response.status_code == 200
+
+
+def test_identical_bodies_are_stored_once(tmp_path) -> None:
+    adapter = PageAdapter(b"<html>same page</html>")
+    session = get_session(tmp_path, adapter)
+
+    for page in range(5):
+        session.get(f"https://www.otodom.pl/pl/oferta/{page}")
+
+    assert count_rows(session.cache, "compressed_responses") == 5
+    assert count_rows(session.cache, "compressed_responses_bodies") == 1
+
+    session.cache.responses.clear()
+    assert count_rows(session.cache, "compressed_responses_bodies") == 0
+
+
+def test_bodies_are_compressed(tmp_path) -> None:
+    body = b"<html>" + b"listing " * 10000 + b"</html>"
+    session = get_session(tmp_path, PageAdapter(body))
+
+    session.get("https://www.otodom.pl/pl/oferta/1")
+
+    with session.cache.responses.connection() as con:
+        (stored_body,) = con.execute(
+            "SELECT body FROM compressed_responses_bodies"
+        ).fetchone()
+    assert len(stored_body) < len(body) / 10
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(rem.cache, "EVICTION_BATCH_SIZE", 1)
+    adapter = PageAdapter(os.urandom(20000), unique=True)
+    session = get_session(tmp_path, adapter, max_size=100000)
+
+    session.get("https://www.otodom.pl/pl/oferta/0")
+    for page in range(1, 10):
+        session.get(f"https://www.otodom.pl/pl/oferta/{page}")
+        # Keep the first listing recently used
+        session.get("https://www.otodom.pl/pl/oferta/0")
+
+    assert session.cache.responses.size() <= 100000
+    assert count_rows(session.cache, "compressed_responses") < 10
+    assert count_rows(session.cache, "compressed_responses") == count_rows(
+        session.cache, "compressed_responses_bodies"
+    )
+
+    requests = adapter.requests
+    session.get("https://www.otodom.pl/pl/oferta/0")
+    assert adapter.requests == requests
+    session.get("https://www.otodom.pl/pl/oferta/1")
+    assert adapter.requests == requests + 1
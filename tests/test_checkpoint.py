@@ -0,0 +1,64 @@
+from rem.checkpoint import CrawlCheckpoint
+
+PAGE_1 = "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1"
+PAGE_2 = "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=2"
+LISTINGS = [
+    "https://www.otodom.pl/pl/oferta/mieszkanie-ID4dG6i",
+    "https://www.otodom.pl/pl/oferta/mieszkanie-ID4fRun",
+]
+METADATA = {"standard": 2, "promoted": 0}
+
+
+def interrupted_crawl(path: str) -> None:
+    checkpoint = CrawlCheckpoint(path)
+    page_1_listings = ["https://www.otodom.pl/pl/oferta/mieszkanie-ID4aaaa"]
+    checkpoint.start_page(PAGE_1, page_1_listings, METADATA)
+    checkpoint.save_listings(page_1_listings)
+    checkpoint.finish_page(PAGE_1)
+    checkpoint.start_page(PAGE_2, LISTINGS, METADATA)
+    # Saved under the canonical url of the listing
+    checkpoint.save_listings(
+        ["https://www.otodom.pl/pl/oferta/inny-tytul-ID4dG6i"]
+    )
+    checkpoint.close()
+
+
+def test_resume_continues_unfinished_pages(tmp_path) -> None:
+    path = str(tmp_path / "checkpoint.jsonl")
+    interrupted_crawl(path)
+
+    checkpoint = CrawlCheckpoint(path, resume=True)
+
+    assert checkpoint.is_finished(PAGE_1)
+    assert not checkpoint.is_finished(PAGE_2)
+    assert checkpoint.resumed_page(PAGE_2) == (LISTINGS[1:], METADATA)
+    assert checkpoint.resumed_page(PAGE_1 + "0") is None
+
+
+def test_torn_entry_is_ignored(tmp_path) -> None:
+    path = str(tmp_path / "checkpoint.jsonl")
+    interrupted_crawl(path)
+    with open(path, "a") as f:
+        f.write('{"finished": "https://www.otodom.pl/pl/ofer')
+
+    checkpoint = CrawlCheckpoint(path, resume=True)
+    checkpoint.finish_page(PAGE_2)
+    checkpoint.close()
+
+    assert CrawlCheckpoint(path, resume=True).is_finished(PAGE_2)
+
+
+def test_crawl_started_over_replaces_the_checkpoint(tmp_path) -> None:
+    path = str(tmp_path / "checkpoint.jsonl")
+    interrupted_crawl(path)
+
+    checkpoint = CrawlCheckpoint(path)
+    assert not checkpoint.is_finished(PAGE_1)
+    checkpoint.start_page(PAGE_2, LISTINGS, METADATA)
+    checkpoint.close()
+
+    resumed = CrawlCheckpoint(path, resume=True)
+    assert not resumed.is_finished(PAGE_1)
+    assert resumed.resumed_page(PAGE_2) == (LISTINGS, METADATA)
+    resumed.clear()
+    assert not (tmp_path / "checkpoint.jsonl").exists()
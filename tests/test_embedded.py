@@ -0,0 +1,102 @@
+import pytest
+from bs4 import BeautifulSoup
+from conftest import read_resource
+
+import rem.utils
+from rem.embedded import find_embedded_ad, parse_embedded_listing
+
+LISTINGS = [
+    "mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i.html",
+    "mieszkanie-12-min-do-centrum.html",
+]
+
+
+@pytest.mark.parametrize(
+    "file_name, page_parsed",
+    [(LISTINGS[0], False), (LISTINGS[1], True)],
+    ids=["listing", "alternative"],
+)
+def test_embedded_listing_gives_the_same_record(
+    scraper, file_name, page_parsed
+) -> None:
+    html = read_resource(file_name)
+    expected = scraper.get_data_from_listing(rem.utils.get_soup(html))
+    parsed_pages = []
+
+    def parse_page(page_html: str):
+        parsed_pages.append(page_html)
+        return rem.utils.get_soup(page_html)
+
+    listing = parse_embedded_listing(html, parse_page)
+    listing_data = scraper.get_data_from_listing(listing)
+
+    del listing_data["created_at"], expected["created_at"]
+    assert listing_data == pytest.approx(expected, nan_ok=True)
+    # The alternative listing lacks some characteristics, so the page is
+    # looked at for them
+    assert bool(parsed_pages) == page_parsed
+
+
+def test_find_embedded_ad() -> None:
+    html = read_resource(LISTINGS[0])
+
+    ad = find_embedded_ad(html)
+
+    assert int(ad["id"]) == 62365446
+    assert find_embedded_ad("<html><body></body></html>") is None
+    assert (
+        find_embedded_ad(
+            '<script id="__NEXT_DATA__" type="application/json">{"props":'
+            "</script>"
+        )
+        is None
+    )
+
+
+def test_missing_parts_are_read_from_the_page(scraper) -> None:
+    html = read_resource(LISTINGS[0])
+    state = html.find('"characteristics":')
+    # Renames the key, so the state lacks the characteristics
+    html = html[:state] + '"characteristicz":' + html[state + 18 :]
+    parsed_pages = []
+
+    def parse_page(page_html: str):
+        parsed_pages.append(page_html)
+        return rem.utils.get_soup(page_html)
+
+    listing = parse_embedded_listing(html, parse_page)
+    assert scraper.get_address(listing) == {
+        "address": "Warszawa, Śródmieście, Belwederska"
+    }
+    assert not parsed_pages
+
+    assert scraper.get_price(listing) == {"price": 1500000}
+    assert scraper.get_size(listing) == {"floor_size_in_m2": 72.0}
+    assert parsed_pages == [html]
+
+
+def test_missing_characteristic_is_read_from_the_page(scraper) -> None:
+    html = read_resource(LISTINGS[0])
+    # Renames the label, so the state has the other characteristics but
+    # lacks the floor
+    html = html.replace('"label":"Piętro"', '"label":"Pietro"')
+    listing = parse_embedded_listing(html, rem.utils.get_soup)
+
+    assert scraper.get_price(listing) == {"price": 1500000}
+    assert listing._page_index is None
+    assert scraper.get_floor(listing) == {
+        "floor": 1,
+        "floors_in_building": 3,
+    }
+    assert listing._page_index is not None
+
+
+def test_scraper_uses_embedded_state(scraper, monkeypatch) -> None:
+    monkeypatch.setattr(scraper, "embedded_state_extraction", True)
+
+    listing = scraper.parse_listing(read_resource(LISTINGS[0]))
+    page = scraper.parse_listing("<html><body></body></html>")
+
+    assert rem.utils.get_listing_index(listing) is listing
+    assert scraper.get_data_from_listing(listing)["price"] == 1500000
+    assert isinstance(page, BeautifulSoup)
@@ -0,0 +1,39 @@
+from rem.extraction_cache import ExtractionCache, page_hash
+
+PAGE = (
+    '<html><script nonce="a1b2">var x;</script>\n'
+    '<script id="__NEXT_DATA__" type="application/json">'
+    '{"buildId":"MyluSgQXzN","userSessionId":"3feb5533",'
+    '"ad":{"id":62365446,"price":1500000}}</script></html>'
+)
+URL = "https://www.otodom.pl/pl/oferta/mieszkanie-ID4dG6i"
+
+
+def test_page_hash_ignores_volatile_parts() -> None:
+    same_listing = (
+        PAGE.replace("a1b2", "c3d4")
+        .replace("MyluSgQXzN", "NewBuild")
+        .replace("3feb5533", "1ca680ed")
+        .replace("\n", "\n  ")
+    )
+    new_price = PAGE.replace("1500000", "1450000")
+
+    assert page_hash(same_listing) == page_hash(PAGE)
+    assert page_hash(new_price) != page_hash(PAGE)
+
+
+def test_records_are_reused_for_the_same_page_and_version(tmp_path) -> None:
+    path = str(tmp_path / "extraction.sqlite")
+    cache = ExtractionCache(path, extractor_version=1)
+    record = {"url": URL, "price": 1500000, "market_type": None}
+
+    assert cache.get(URL, page_hash(PAGE)) is None
+    cache.put(URL, page_hash(PAGE), record)
+
+    assert cache.get(URL, page_hash(PAGE)) == record
+    assert cache.get(URL, page_hash(PAGE + " ")) == record
+    assert cache.get(URL, page_hash(PAGE + "<p>")) is None
+    assert cache.get(URL + "?x", page_hash(PAGE)) is None
+    cache.close()
+    assert ExtractionCache(path, 1).get(URL, page_hash(PAGE)) == record
+    assert ExtractionCache(path, 2).get(URL, page_hash(PAGE)) is None
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from rem.fetcher import fetch_concurrently
+
+
+def test_fetch_concurrently_keeps_order() -> None:
+    delays = {"a": 0.03, "b": 0.01, "c": 0.02, "d": 0.0}
+
+    def fetch(url):
+        time.sleep(delays[url])
+        return url.upper()
+
+    results = fetch_concurrently(fetch, ["a", "b", "c", "d"], 4)
+    assert results == ["A", "B", "C", "D"]
+
+
+def test_fetch_concurrently_respects_limit() -> None:
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def fetch(url):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return url
+
+    urls = [str(i) for i in range(20)]
+    assert fetch_concurrently(fetch, urls, 3) == urls
+    assert max_in_flight <= 3
+
+
+def test_fetch_concurrently_no_urls() -> None:
+    assert fetch_concurrently(lambda url: url, [], 4) == []
+
+
+def test_fetch_concurrently_with_dynamic_limit() -> None:
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def fetch(url):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return url
+
+    urls = [str(i) for i in range(10)]
+    results = fetch_concurrently(fetch, urls, lambda: 2, max_workers=8)
+    assert results == urls
+    assert max_in_flight <= 2
@@ -0,0 +1,105 @@
+import hashlib
+
+import pandas as pd
+import pytest
+
+from rem.history import ListingHistory
+
+DESCRIPTION = "Gratka dla fanów kamienic! " * 100
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = ListingHistory(str(tmp_path / "history.sqlite"))
+    yield history
+    history.close()
+
+
+def snapshot(
+    created_at: str, price: float, monthly_fee=800.0, description=DESCRIPTION
+):
+    return pd.DataFrame(
+        {
+            "created_at": [created_at, created_at],
+            "unique_id": [62365446.0, 62365447.0],
+            "price": [price, 500000.0],
+            "monthly_fee": [monthly_fee, float("nan")],
+            "ad_description": [description, "Doskonała"],
+        }
+    )
+
+
+def test_only_changes_are_stored(history) -> None:
+    assert history.add(snapshot("2022-09-01 08:00:00", 1500000.0)) == 8
+    assert history.add(snapshot("2022-09-02 08:00:00", 1500000.0)) == 0
+    assert history.add(snapshot("2022-09-03 08:00:00", 1450000.0)) == 1
+    assert history.add(snapshot("2022-09-04 08:00:00", 1450000.0, 900)) == 1
+
+    assert len(history) == 2
+    assert history.field_history(62365446, "price") == [
+        ("2022-09-01 08:00:00", 1500000),
+        ("2022-09-03 08:00:00", 1450000),
+    ]
+    assert history.latest(62365446)["monthly_fee"] == 900
+    assert history.latest(62365447)["monthly_fee"] is None
+
+
+def test_listings_as_of(history) -> None:
+    history.add(snapshot("2022-09-01 08:00:00", 1500000.0))
+    history.add(snapshot("2022-09-03 08:00:00", 1450000.0))
+    history.add(
+        [
+            {
+                "created_at": "2022-09-05 08:00:00",
+                "unique_id": 1,
+                "price": 700000,
+            },
+            {"created_at": "2022-09-05 08:00:00", "price": 1},
+        ]
+    )
+
+    before = history.as_of("2022-08-31")
+    between = history.as_of("2022-09-02")
+    after = history.as_of("2022-09-06")
+
+    assert before.empty
+    assert list(between["unique_id"]) == [62365446, 62365447]
+    assert list(between["price"]) == [1500000, 500000]
+    assert list(after["price"]) == [700000, 1450000, 500000]
+    assert history.listing_as_of(62365446, "2022-09-02") == {
+        "unique_id": 62365446,
+        "price": 1500000,
+        "monthly_fee": 800,
+        "ad_description": DESCRIPTION,
+    }
+    assert history.listing_as_of(62365446, "2022-08-31") is None
+
+
+def test_description_changes_are_stored_as_hashes(history) -> None:
+    new_description = DESCRIPTION + "Cena do negocjacji."
+    history.add(snapshot("2022-09-01 08:00:00", 1500000.0))
+
+    assert (
+        history.add(
+            snapshot("2022-09-02 08:00:00", 1500000.0, 800.0, new_description)
+        )
+        == 1
+    )
+    assert (
+        history.add(
+            snapshot("2022-09-03 08:00:00", 1500000.0, 800.0, new_description)
+        )
+        == 0
+    )
+
+    new_hash = hashlib.sha256(new_description.encode("utf-8")).hexdigest()
+    assert history.field_history(62365446, "ad_description") == [
+        ("2022-09-01 08:00:00", DESCRIPTION),
+        ("2022-09-02 08:00:00", f"sha256:{new_hash}"),
+    ]
+    assert (
+        history.listing_as_of(62365446, "2022-09-01 12:00:00")[
+            "ad_description"
+        ]
+        == DESCRIPTION
+    )
@@ -1,3 +1,5 @@
+import pytest
+
 import main
 
 
@@ -40,3 +42,80 @@ def test_default_page_limit() -> None:
     parsed = main.parse_args(arguments)
 
     assert parsed.page_limit == 1
+
+
+def test_parse_concurrent_requests() -> None:
+    arguments = [
+        "--url",
+        "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1&limit=72",
+        "--concurrent_requests",
+        "8",
+    ]
+    parsed = main.parse_args(arguments)
+
+    assert parsed.concurrent_requests == 8
+
+
+def test_numeric_options_default_to_the_settings() -> None:
+    url = "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa"
+    parsed = main.parse_args(["--url", url])
+
+    # None leaves the settings as they are
+    assert parsed.concurrent_requests is None
+    assert parsed.requests_per_second is None
+    assert parsed.workers is None
+
+    arguments = ["--url", url, "--concurrent_requests", "1"]
+    arguments += ["--requests_per_second", "0"]
+    parsed = main.parse_args(arguments)
+
+    assert parsed.concurrent_requests == 1
+    assert parsed.requests_per_second == 0.0
+
+
+def test_parse_resume() -> None:
+    arguments = [
+        "--url",
+        "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1&limit=72",
+        "--data_file_name",
+        "test_run",
+        "--resume",
+    ]
+
+    assert main.parse_args(arguments).resume
+    assert not main.parse_args(arguments[:-1]).resume
+
+
+def test_resume_requires_data_file_name() -> None:
+    arguments = [
+        "--url",
+        "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1&limit=72",
+        "--resume",
+    ]
+
+    with pytest.raises(SystemExit):
+        main.parse_args(arguments)
+
+
+def test_parse_jsonl() -> None:
+    arguments = [
+        "--url",
+        "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1&limit=72",
+        "--jsonl",
+    ]
+
+    assert main.parse_args(arguments).jsonl
+
+
+def test_parse_replay() -> None:
+    arguments = ["--replay", "data/html_archive", "--workers", "4"]
+    parsed = main.parse_args(arguments)
+
+    assert parsed.replay == "data/html_archive"
+    assert parsed.url is None
+    assert parsed.workers == 4
+
+
+def test_url_or_replay_is_required() -> None:
+    with pytest.raises(SystemExit):
+        main.parse_args(["--data_file_name", "test_run"])
@@ -1,18 +1,25 @@
 import datetime
+import multiprocessing
 import os
 import re
 import time
 
 import pandas as pd
+import requests
 import pytest
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+from requests import Response
+from requests.adapters import BaseAdapter
 from requests_cache import CachedSession
 
 import rem.otodom
 import rem.utils
 from rem.config import get_settings, Settings
 
+from rem.extraction_cache import ExtractionCache
 from rem.otodom import Otodom
+from rem.seen import SeenListings
 
 
 @pytest.fixture(scope="session")
@@ -24,6 +31,77 @@ def test_session() -> CachedSession:
     return test_session
 
 
+class RevalidatingAdapter(BaseAdapter):
+    """Serves a fixed body with an ETag, answering 304 when it matches."""
+
+    def __init__(self, body: bytes):
+        super().__init__()
+        self.body = body
+        self.conditional_requests = 0
+
+    def send(self, request, **kwargs):
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.headers["ETag"] = '"v1"'
+        if request.headers.get("If-None-Match") == '"v1"':
+            self.conditional_requests += 1
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = self.body
+        return response
+
+    def close(self):
+        pass
+
+
+class VersionedAdapter(BaseAdapter):
+    """Serves a new version of the page on every request."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.status_code = 200
+        response._content = f"<html>v{self.requests}</html>".encode()
+        return response
+
+    def close(self):
+        pass
+
+
+class FailingAdapter(BaseAdapter):
+    """Answers with the given statuses in turn, then with 200."""
+
+    def __init__(self, *responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        status_code, headers = (
+            self.responses.pop(0) if self.responses else (200, {})
+        )
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.status_code = status_code
+        response.headers.update(headers)
+        response._content = f"<html>{status_code}</html>".encode()
+        return response
+
+    def close(self):
+        pass
+
+
 @pytest.fixture(scope="session", autouse=False)
 def otodom_settings() -> Settings:
     my_settings = get_settings()
@@ -412,6 +490,58 @@ def test_get_basement(otodom_instance, listing) -> None:
     assert basement == {"basement": 1}
 
 
+def test_get_basement_without_one(otodom_instance, listing) -> None:
+    soup = rem.utils.get_soup(str(listing).replace("piwnica", "strych"))
+
+    assert otodom_instance.get_basement(soup) == {"basement": 0}
+    assert otodom_instance.get_air_conditioning(soup) == {
+        "air_conditioning": 1
+    }
+
+
+def test_get_amenities(otodom_instance, listing) -> None:
+    amenities = otodom_instance.get_data_from_listing(listing)["amenities"]
+    assert amenities == rem.otodom.amenity_mask(
+        "air_conditioning", "basement", "balcony", "parking", "garage"
+    )
+    mask = rem.otodom.amenity_mask("balcony", "garage")
+    assert amenities & mask == mask
+    assert not amenities & rem.otodom.amenity_mask("elevator")
+
+
+def test_amenities_are_read_from_the_record(otodom_instance) -> None:
+    record = dict.fromkeys(rem.otodom.AMENITIES, 0)
+    record.update(elevator=1, garden=1)
+
+    assert otodom_instance.get_amenities(record) == {
+        "amenities": rem.otodom.amenity_mask("elevator", "garden")
+    }
+    record["garage"] = None
+    assert otodom_instance.get_amenities(record) == {"amenities": None}
+
+
+def test_additional_features_are_resolved_once(
+    otodom_instance, monkeypatch
+) -> None:
+    path = os.sep.join(
+        ["tests", "resources", "mieszkanie-12-min-do-centrum.html"]
+    )
+    with open(path, encoding="utf-8") as fp:
+        soup = rem.utils.get_soup(fp)
+    calls = []
+    resolve = Otodom._resolve_additional_features
+    monkeypatch.setattr(
+        Otodom,
+        "_resolve_additional_features",
+        lambda index: calls.append(index) or resolve(index),
+    )
+
+    otodom_instance.get_elevator(soup)
+    otodom_instance.get_data_from_listing(soup)
+
+    assert len(calls) == 1
+
+
 def test_get_promoted_listing_urls_for_search_page(
     otodom_instance, search_soup
 ) -> None:
@@ -521,14 +651,64 @@ def test_url_generator_with_query_parameters(otodom_instance):
 def test_get_data_from_listing(otodom_instance, listing) -> None:
     listing_data = otodom_instance.get_data_from_listing(listing)
 
-    assert isinstance(listing_data, pd.Series)
-    assert listing_data.loc["price"] == 1500000
-    assert listing_data.loc["floor_size_in_m2"] == float(72)
-    assert listing_data.loc["building_type"] == "kamienica"
-    assert listing_data.loc["windows_type"] == "plastikowe"
-    assert listing_data.loc["year_of_construction"] == 1939
-    assert listing_data.loc["number_of_rooms"] == 3
-    assert listing_data.loc["condition"] == "do zamieszkania"
+    assert isinstance(listing_data, dict)
+    assert tuple(listing_data) == rem.otodom.LISTING_COLUMNS
+    assert listing_data["price"] == 1500000
+    assert listing_data["floor_size_in_m2"] == float(72)
+    assert listing_data["building_type"] == "kamienica"
+    assert listing_data["windows_type"] == "plastikowe"
+    assert listing_data["year_of_construction"] == 1939
+    assert listing_data["number_of_rooms"] == 3
+    assert listing_data["condition"] == "do zamieszkania"
+
+
+PARSERS = [
+    pytest.param(
+        parser,
+        marks=pytest.mark.skipif(
+            builder_registry.lookup(parser) is None,
+            reason=f"{parser} is not installed",
+        ),
+    )
+    for parser in ["lxml", "html5lib"]
+]
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize(
+    "file_name",
+    [
+        "mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i.html",
+        "mieszkanie-12-min-do-centrum.html",
+    ],
+)
+def test_data_from_listing_is_parser_independent(
+    otodom_instance, parser, file_name
+) -> None:
+    path = os.sep.join(["tests", "resources", file_name])
+    with open(path, encoding="utf-8") as fp:
+        html = fp.read()
+
+    expected = otodom_instance.get_data_from_listing(rem.utils.get_soup(html))
+    listing_data = otodom_instance.get_data_from_listing(
+        rem.utils.get_soup(html, parser)
+    )
+
+    del listing_data["created_at"], expected["created_at"]
+    assert listing_data == pytest.approx(expected, nan_ok=True)
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_search_page_urls_are_parser_independent(
+    otodom_instance, search_soup, parser
+) -> None:
+    path = os.sep.join(["tests", "resources", "warszawa-page-1.html"])
+    with open(path, encoding="utf-8") as fp:
+        soup = rem.utils.get_soup(fp, parser)
+
+    assert otodom_instance.get_all_relevant_listing_urls_for_page(
+        soup
+    ) == otodom_instance.get_all_relevant_listing_urls_for_page(search_soup)
 
 
 def test_update_listing_data(
@@ -546,8 +726,75 @@ def test_update_listing_data(
     assert listing_data.loc[1, "year_of_construction"] is None
 
 
-def test_old_and_new_url(otodom_instance) -> None:
-    otodom_instance.data = pd.DataFrame(data={"url": ["sample.com"]})
+def test_parse_pool_falls_back_without_forkserver(monkeypatch) -> None:
+    monkeypatch.setattr(
+        multiprocessing, "get_all_start_methods", lambda: ["spawn"]
+    )
+
+    assert rem.otodom._parse_pool_context() is multiprocessing.get_context()
+
+
+def test_parse_workers_give_the_same_data(
+    otodom_settings, test_session, listing, alternative_listing
+) -> None:
+    serial = Otodom(otodom_settings, test_session)
+    serial.process_listing_soups([listing, alternative_listing])
+    parallel = Otodom(
+        otodom_settings.copy(update={"PARSE_WORKERS": 2}), test_session
+    )
+    try:
+        parallel.process_listing_htmls(
+            [str(listing), str(alternative_listing)]
+        )
+    finally:
+        parallel.close_parse_pool()
+
+    pd.testing.assert_frame_equal(
+        parallel.data.drop(columns="created_at"),
+        serial.data.drop(columns="created_at"),
+    )
+
+
+def test_unchanged_listings_are_not_extracted_again(
+    otodom_settings, test_session, listing, alternative_listing, tmp_path
+) -> None:
+    otodom = Otodom(otodom_settings, test_session)
+    expected = list(
+        otodom.extract_listing_soups([listing, alternative_listing])
+    )
+    otodom.extraction_cache = ExtractionCache(
+        str(tmp_path / "extraction.sqlite"), rem.otodom.EXTRACTOR_VERSION
+    )
+    pages = [("a", str(listing)), ("b", str(alternative_listing))]
+    extracted = []
+    extract_record = otodom.extract_record
+
+    def counted_extract_record(html):
+        extracted.append(html)
+        return extract_record(html)
+
+    otodom.extract_record = counted_extract_record
+
+    first = list(otodom.extract_listing_pages(pages))
+    second = list(otodom.extract_listing_pages(pages))
+    # The page of another listing under the same url
+    list(otodom.extract_listing_pages([("b", str(listing))]))
+
+    assert len(extracted) == 3
+    for records in [first, second]:
+        for record, expected_record in zip(records, expected):
+            assert record["created_at"] > expected_record["created_at"]
+            del record["created_at"]
+            assert record == {
+                key: value
+                for key, value in expected_record.items()
+                if key != "created_at"
+            }
+
+
+def test_old_and_new_url(otodom_instance, monkeypatch) -> None:
+    monkeypatch.setattr(otodom_instance, "seen_listings", SeenListings())
+    otodom_instance.add_new_listing_data({"url": "sample.com"})
     test_url_not_in_data = "not-in-db.com"
     test_url_in_data = "sample.com"
 
@@ -555,6 +802,193 @@ def test_old_and_new_url(otodom_instance) -> None:
     assert otodom_instance.is_url_new(test_url_not_in_data) == True
 
 
+def test_seen_listings_are_loaded_from_data(otodom_settings, tmp_path) -> None:
+    data = pd.DataFrame(
+        {"url": ["https://www.otodom.pl/pl/oferta/mieszkanie-ID4dG6i"]}
+    )
+    data.to_csv(tmp_path / "seen_test.csv")
+    seen_settings = otodom_settings.copy(
+        update={
+            "LOAD_FROM_DATA": True,
+            "SAVE_TO_FILE": True,
+            "DATA_DIRECTORY": str(tmp_path),
+            "DATA_FILE_NAME": "seen_test",
+        }
+    )
+    otodom = Otodom(seen_settings)
+    # Only the urls are read, the data itself only by `scrap`
+    assert otodom.data.empty
+    otodom.seen_listings.close()
+    os.remove(tmp_path / "seen_test.csv")
+
+    otodom = Otodom(seen_settings)
+
+    assert otodom.data.empty
+    assert not otodom.is_url_new(
+        "https://www.otodom.pl/pl/oferta/mieszkanie-w-kamienicy-ID4dG6i"
+    )
+    assert otodom.is_url_new("https://www.otodom.pl/pl/oferta/inne-ID4fRun")
+
+
+def test_seen_listings_are_persisted_once_saved(
+    otodom_settings, tmp_path
+) -> None:
+    pd.DataFrame(
+        {"url": ["https://www.otodom.pl/pl/oferta/a-ID4dG6i"]}
+    ).to_csv(tmp_path / "seen_test.csv")
+    seen_settings = otodom_settings.copy(
+        update={
+            "LOAD_FROM_DATA": True,
+            "SAVE_TO_FILE": True,
+            "DATA_DIRECTORY": str(tmp_path),
+            "DATA_FILE_NAME": "seen_test",
+            "DATA_FORMAT": "csv",
+        }
+    )
+    seen_path = str(tmp_path / "seen_test_seen.sqlite")
+    new_url = "https://www.otodom.pl/pl/oferta/b-ID4fRun"
+
+    otodom = Otodom(seen_settings)
+    otodom.add_new_listing_data({"url": new_url})
+    otodom.flush_new_listing_data()
+
+    assert not otodom.is_url_new(new_url)
+    assert new_url not in SeenListings(seen_path)
+
+    otodom.save_new_listing_data()
+
+    assert new_url in SeenListings(seen_path)
+
+    Otodom(seen_settings.copy(update={"SAVE_TO_FILE": False}))
+
+    assert len(SeenListings(seen_path)) == 2
+
+
+def test_offline_instances_dont_open_the_data_file(
+    otodom_settings, tmp_path
+) -> None:
+    store_settings = otodom_settings.copy(
+        update={
+            "SAVE_TO_FILE": True,
+            "DATA_DIRECTORY": str(tmp_path),
+            "DATA_FORMAT": "sqlite",
+        }
+    )
+
+    assert Otodom(store_settings, offline=True).data_sink is None
+    assert not os.listdir(tmp_path)
+    assert Otodom(store_settings).data_sink is not None
+    assert (tmp_path / "otodom_test.sqlite").exists()
+
+
+def test_interrupted_crawl_is_resumed(otodom_settings, tmp_path) -> None:
+    crawl_settings = otodom_settings.copy(
+        update={
+            "SAVE_TO_FILE": True,
+            "DATA_DIRECTORY": str(tmp_path),
+            "DATA_FILE_NAME": "resume_test",
+            "DATA_FORMAT": "csv",
+            "PAGE_LIMIT": 3,
+            "PARSE_WORKERS": 0,
+        }
+    )
+    requested_pages = []
+    fetched_listings = []
+
+    def get_listing_urls_for_search_url(url):
+        requested_pages.append(url)
+        page = re.search(r"page=(\d+)", url).group(1)
+        return [
+            f"https://www.otodom.pl/pl/oferta/m-ID{page}x{listing}"
+            for listing in range(2)
+        ], {"standard": 2, "promoted": 0}
+
+    def crawl(otodom, interrupted_page=None):
+        def get_soups_from_listing_urls(listing_urls):
+            fetched_listings.extend(listing_urls)
+            return listing_urls
+
+        def extract_listing_soups(listing_urls):
+            for listing_url in listing_urls:
+                if f"ID{interrupted_page}x1" in listing_url:
+                    raise KeyboardInterrupt
+                yield {"url": listing_url}
+
+        otodom.get_listing_urls_for_search_url = (
+            get_listing_urls_for_search_url
+        )
+        otodom.get_soups_from_listing_urls = get_soups_from_listing_urls
+        otodom.extract_listing_soups = extract_listing_soups
+        return otodom.scrap()
+
+    with pytest.raises(KeyboardInterrupt):
+        crawl(Otodom(crawl_settings), interrupted_page=2)
+    requested_pages.clear()
+    fetched_listings.clear()
+
+    data, _ = crawl(Otodom(crawl_settings.copy(update={"RESUME": True})))
+
+    assert [url.split("?")[-1] for url in requested_pages] == [
+        "page=3&limit=72"
+    ]
+    assert [url.split("-")[-1] for url in fetched_listings] == [
+        "ID2x1",
+        "ID3x0",
+        "ID3x1",
+    ]
+    assert sorted(url.split("-")[-1] for url in data["url"]) == [
+        f"ID{page}x{listing}" for page in range(1, 4) for listing in range(2)
+    ]
+    assert not (tmp_path / "resume_test_checkpoint.jsonl").exists()
+
+
+def test_iter_listings_keeps_only_unsaved_rows(
+    otodom_settings, tmp_path, monkeypatch
+) -> None:
+    otodom = Otodom(
+        otodom_settings.copy(
+            update={
+                "SAVE_TO_FILE": True,
+                "DATA_DIRECTORY": str(tmp_path),
+                "DATA_FILE_NAME": "stream_test",
+                "DATA_FORMAT": "csv",
+                "PAGE_LIMIT": 3,
+                "PARSE_WORKERS": 0,
+            }
+        )
+    )
+    monkeypatch.setattr(
+        otodom,
+        "get_listing_urls_for_search_url",
+        lambda url: (
+            [f"{url}#listing-{listing}" for listing in range(2)],
+            {"standard": 2, "promoted": 0},
+        ),
+    )
+    monkeypatch.setattr(
+        otodom,
+        "get_soups_from_listing_urls",
+        lambda listing_urls: listing_urls,
+    )
+    monkeypatch.setattr(
+        otodom,
+        "extract_listing_soups",
+        lambda listing_urls: ({"url": url} for url in listing_urls),
+    )
+    rows_in_memory = []
+
+    records = []
+    for record in otodom.iter_listings():
+        records.append(record)
+        rows_in_memory.append(len(otodom.data) + len(otodom.new_listings))
+
+    saved = pd.read_csv(tmp_path / "stream_test.csv", index_col=0)
+    assert len(records) == 6
+    assert max(rows_in_memory) == 2
+    assert otodom.data.empty
+    assert list(saved["url"]) == [record["url"] for record in records]
+
+
 def test_main_page_not_scraped(otodom_instance, search_soup) -> None:
     (
         relevant_listings,
@@ -582,3 +1016,171 @@ def test_scrap(test_session, otodom_settings):
 
     assert isinstance(scrapped_data, pd.DataFrame)
     assert len(scrapped_data.index) == 75
+
+
+def test_prefetch_search_pages(otodom_instance, monkeypatch) -> None:
+    requested = []
+
+    def get_listing_urls_for_search_url(url):
+        requested.append(url)
+        return [f"{url}/listing"], {"standard": 1, "promoted": 0}
+
+    monkeypatch.setattr(
+        otodom_instance,
+        "get_listing_urls_for_search_url",
+        get_listing_urls_for_search_url,
+    )
+    monkeypatch.setattr(otodom_instance, "search_page_prefetch", 2)
+
+    search_pages = otodom_instance.prefetch_search_pages(
+        ["page-1", "page-2", "page-3", "page-4"]
+    )
+    url, search_page = next(search_pages)
+
+    assert url == "page-1"
+    assert search_page.result() == (
+        ["page-1/listing"],
+        {"standard": 1, "promoted": 0},
+    )
+    deadline = time.time() + 5
+    while len(requested) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(requested) == ["page-1", "page-2", "page-3"]
+
+    remaining = [(url, page.result()[0]) for url, page in search_pages]
+    assert remaining == [
+        ("page-2", ["page-2/listing"]),
+        ("page-3", ["page-3/listing"]),
+        ("page-4", ["page-4/listing"]),
+    ]
+
+
+def test_search_pages_are_sequential_without_prefetch(
+    otodom_instance, monkeypatch
+) -> None:
+    requested = []
+
+    def get_listing_urls_for_search_url(url):
+        requested.append(url)
+        return [f"{url}/listing"], {"standard": 1, "promoted": 0}
+
+    monkeypatch.setattr(
+        otodom_instance,
+        "get_listing_urls_for_search_url",
+        get_listing_urls_for_search_url,
+    )
+    monkeypatch.setattr(otodom_instance, "search_page_prefetch", 0)
+
+    search_pages = otodom_instance.prefetch_search_pages(
+        ["page-1", "page-2", "page-3"]
+    )
+    for page, (url, search_page) in enumerate(search_pages, start=1):
+        search_page.result()
+        time.sleep(0.05)
+        assert requested == [f"page-{number}" for number in range(1, page + 1)]
+    assert len(requested) == 3
+
+
+def test_listing_revalidation(otodom_settings) -> None:
+    session = CachedSession(
+        "revalidation_test",
+        backend="memory",
+        urls_expire_after={"*otodom.pl/pl/oferta/**": 1},
+    )
+    adapter = RevalidatingAdapter(b"<html>listing</html>")
+    session.mount("https://", adapter)
+    otodom = Otodom(otodom_settings, session)
+    url = "https://www.otodom.pl/pl/oferta/mieszkanie-ID4dG6i"
+
+    assert otodom.get_website(url).content == b"<html>listing</html>"
+    assert otodom.get_website(url).content == b"<html>listing</html>"
+    time.sleep(1.1)
+    assert otodom.get_website(url).content == b"<html>listing</html>"
+
+    assert adapter.conditional_requests == 1
+    assert otodom.cache_statistics == {
+        "cache_hits": 1,
+        "cache_revalidated": 1,
+        "cache_stale": 0,
+        "cache_misses": 1,
+    }
+
+
+def test_stale_search_page_is_served_while_revalidating(
+    otodom_settings, monkeypatch
+) -> None:
+    monkeypatch.setattr(otodom_settings, "SEARCH_PAGE_MAX_STALENESS", 60)
+    session = CachedSession(
+        "stale_while_revalidate_test",
+        backend="memory",
+        urls_expire_after={"*otodom.pl/pl/oferty/**": 1},
+    )
+    adapter = VersionedAdapter()
+    session.mount("https://", adapter)
+    otodom = Otodom(otodom_settings, session)
+    url = "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa"
+
+    assert otodom.get_website(url).content == b"<html>v1</html>"
+    assert otodom._refresh_executor is None
+    time.sleep(1.1)
+    assert otodom.get_website(url).content == b"<html>v1</html>"
+    otodom.close_refresh_executor()
+    assert otodom._refresh_executor is None
+    assert otodom.get_website(url).content == b"<html>v2</html>"
+
+    assert adapter.requests == 2
+    assert otodom.cache_statistics["cache_stale"] == 1
+    assert otodom.cache_statistics["cache_hits"] == 1
+
+
+def test_too_stale_search_page_is_refetched(
+    otodom_settings, monkeypatch
+) -> None:
+    monkeypatch.setattr(otodom_settings, "SEARCH_PAGE_MAX_STALENESS", 0)
+    session = CachedSession(
+        "stale_while_revalidate_test",
+        backend="memory",
+        urls_expire_after={"*otodom.pl/pl/oferty/**": 1},
+    )
+    session.mount("https://", VersionedAdapter())
+    otodom = Otodom(otodom_settings, session)
+    url = "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa"
+
+    assert otodom.get_website(url).content == b"<html>v1</html>"
+    time.sleep(1.1)
+    assert otodom.get_website(url).content == b"<html>v2</html>"
+
+
+def test_failed_requests_are_retried_after_a_delay(
+    otodom_settings, monkeypatch
+) -> None:
+    session = requests.Session()
+    adapter = FailingAdapter((429, {"Retry-After": "3"}), (503, {}))
+    session.mount("https://", adapter)
+    otodom = Otodom(
+        otodom_settings.copy(update={"MAX_RETRIES": 2, "RETRY_BACKOFF": 0.5}),
+        session,
+    )
+    delays = []
+    monkeypatch.setattr(rem.otodom.time, "sleep", delays.append)
+
+    page = otodom.get_website("https://www.otodom.pl/pl/oferta/a-ID4dG6i")
+
+    assert page.status_code == 200
+    assert adapter.requests == 3
+    assert delays == [3, 1.0]
+
+
+def test_last_failed_attempt_raises(otodom_settings, monkeypatch) -> None:
+    session = requests.Session()
+    adapter = FailingAdapter((503, {}), (503, {}))
+    session.mount("https://", adapter)
+    otodom = Otodom(
+        otodom_settings.copy(update={"MAX_RETRIES": 1, "RETRY_BACKOFF": 0}),
+        session,
+    )
+    monkeypatch.setattr(rem.otodom.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(requests.HTTPError):
+        otodom.get_website("https://www.otodom.pl/pl/oferta/a-ID4dG6i")
+    assert adapter.requests == 2
@@ -0,0 +1,137 @@
+import datetime
+import os
+
+import pytest
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+
+from rem.ratelimit import (
+    AdaptiveRateController,
+    RateLimitedAdapter,
+    TokenBucket,
+    retry_delay,
+)
+
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request.url)
+        return "response"
+
+    def close(self):
+        pass
+
+
+def test_burst_is_free_then_spaced_by_rate() -> None:
+    bucket = TokenBucket(rate=10, burst=2)
+
+    assert bucket.reserve("otodom.pl") == 0
+    assert bucket.reserve("otodom.pl") == 0
+    assert bucket.reserve("otodom.pl") == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve("otodom.pl") == pytest.approx(0.2, abs=0.01)
+
+
+def test_buckets_are_per_host() -> None:
+    bucket = TokenBucket(rate=1, burst=1)
+
+    assert bucket.reserve("otodom.pl") == 0
+    assert bucket.reserve("example.com") == 0
+    assert bucket.reserve("otodom.pl") > 0
+
+
+def test_state_file_is_shared_between_limiters(tmp_path) -> None:
+    state_file = os.sep.join([str(tmp_path), "rate_limit.json"])
+    first_process = TokenBucket(rate=1, burst=1, state_file=state_file)
+    second_process = TokenBucket(rate=1, burst=1, state_file=state_file)
+
+    assert first_process.reserve("otodom.pl") == 0
+    assert second_process.reserve("otodom.pl") == pytest.approx(1, abs=0.05)
+
+
+def test_invalid_rate() -> None:
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_adapter_acquires_before_sending() -> None:
+    bucket = TokenBucket(rate=1000, burst=1)
+    wrapped = RecordingAdapter()
+    adapter = RateLimitedAdapter(bucket, wrapped)
+    request = PreparedRequest()
+    request.prepare(method="GET", url="https://www.otodom.pl/pl/oferta/x")
+
+    assert adapter.send(request) == "response"
+    assert wrapped.sent == ["https://www.otodom.pl/pl/oferta/x"]
+    assert bucket.reserve("www.otodom.pl") > 0
+
+
+def test_controller_increases_rate_when_healthy() -> None:
+    bucket = TokenBucket(rate=1, burst=1)
+    controller = AdaptiveRateController(
+        bucket,
+        min_rate=0.5,
+        max_rate=1.3,
+        target_latency=2,
+        max_concurrency=4,
+        increase=0.1,
+    )
+
+    for _ in range(5):
+        controller.record(0.5, 200)
+
+    assert bucket.rate == pytest.approx(1.3)
+    assert controller.concurrency == 2
+
+
+def test_controller_does_not_increase_on_slow_responses() -> None:
+    bucket = TokenBucket(rate=1, burst=1)
+    controller = AdaptiveRateController(
+        bucket, min_rate=0.5, max_rate=5, target_latency=2
+    )
+
+    controller.record(3, 200)
+
+    assert bucket.rate == 1
+
+
+@pytest.mark.parametrize("status_code", [429, 503, None])
+def test_controller_backs_off_on_failures(status_code) -> None:
+    bucket = TokenBucket(rate=4, burst=1)
+    controller = AdaptiveRateController(
+        bucket, min_rate=0.5, max_rate=5, target_latency=2, decrease=0.5
+    )
+
+    controller.record(0.1, status_code)
+    controller.record(0.1, status_code)
+
+    assert bucket.rate == 2
+    assert controller.statistics()["backoffs"] == 1
+
+
+def test_controller_concurrency_is_capped() -> None:
+    bucket = TokenBucket(rate=10, burst=1)
+    controller = AdaptiveRateController(
+        bucket, min_rate=1, max_rate=10, target_latency=2, max_concurrency=4
+    )
+
+    assert controller.concurrency == 4
+
+
+def test_retry_delay_honours_retry_after() -> None:
+    response = Response()
+
+    assert retry_delay(None, 0, 1.5) == 1.5
+    assert retry_delay(response, 2, 1.5) == 6
+    response.headers["Retry-After"] = "7"
+    assert retry_delay(response, 2, 1.5) == 7
+    retry_at = datetime.datetime.now(
+        datetime.timezone.utc
+    ) + datetime.timedelta(seconds=30)
+    response.headers["Retry-After"] = retry_at.strftime(
+        "%a, %d %b %Y %H:%M:%S GMT"
+    )
+    assert 25 < retry_delay(response, 0, 1.5) <= 30
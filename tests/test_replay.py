@@ -0,0 +1,91 @@
+import datetime
+import os
+import shutil
+
+import pytest
+
+import rem.utils
+from rem.archive import HtmlArchive
+from rem.config import get_settings, Settings
+from rem.otodom import Otodom
+from rem.replay import iter_saved_listings, replay
+
+LISTINGS = {
+    "https://www.otodom.pl/pl/oferta/mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i": "mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i.html",
+    "https://www.otodom.pl/pl/oferta/mieszkanie-12-min-do-centrum-ID4fRun": "mieszkanie-12-min-do-centrum.html",
+}
+SEARCH_PAGE = "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1&limit=72"
+
+
+def read_resource(file_name: str) -> str:
+    path = os.sep.join(["tests", "resources", file_name])
+    with open(path, encoding="utf-8") as fp:
+        return fp.read()
+
+
+@pytest.fixture(scope="module")
+def replay_settings() -> Settings:
+    my_settings = get_settings()
+    my_settings.LOAD_FROM_DATA = False
+    my_settings.USE_GOOGLE_MAPS_API = False
+    return my_settings
+
+
+@pytest.fixture
+def archive_path(tmp_path) -> str:
+    archive = HtmlArchive(str(tmp_path))
+    archive.write(SEARCH_PAGE, read_resource("warszawa-page-1.html"))
+    for url, file_name in LISTINGS.items():
+        archive.write(
+            url, "<html>old</html>", datetime.datetime(2022, 1, 1, 12)
+        )
+        archive.write(
+            url, read_resource(file_name), datetime.datetime(2022, 2, 1, 12)
+        )
+    archive.close()
+    return str(tmp_path)
+
+
+def test_iter_saved_listings_from_archive(archive_path) -> None:
+    pages = list(iter_saved_listings(archive_path))
+
+    assert [html for _, html in pages] == [
+        read_resource(file_name) for file_name in LISTINGS.values()
+    ]
+    assert all(
+        fetched_at == datetime.datetime(2022, 2, 1, 12)
+        for fetched_at, _ in pages
+    )
+
+
+def test_iter_saved_listings_from_directory(tmp_path) -> None:
+    for file_name in LISTINGS.values():
+        shutil.copy(os.sep.join(["tests", "resources", file_name]), tmp_path)
+    with open(tmp_path / "warszawa?page=1&limit=72.html", "w") as f:
+        f.write(read_resource("warszawa-page-1.html"))
+
+    pages = list(iter_saved_listings(str(tmp_path)))
+
+    assert sorted(html for _, html in pages) == sorted(
+        read_resource(file_name) for file_name in LISTINGS.values()
+    )
+
+
+def test_replay_matches_online_extraction(
+    archive_path, replay_settings
+) -> None:
+    data = replay(archive_path, replay_settings, workers=2, chunk_size=1)
+
+    scraper = Otodom(replay_settings, offline=True)
+    assert scraper.session is None
+    assert len(data) == len(LISTINGS)
+    for (_, row), file_name in zip(data.iterrows(), LISTINGS.values()):
+        expected = scraper.get_data_from_listing(
+            rem.utils.get_soup(read_resource(file_name))
+        )
+        assert row["created_at"] == str(datetime.datetime(2022, 2, 1, 12))
+        assert row.drop("created_at").dropna().to_dict() == {
+            column: value
+            for column, value in expected.items()
+            if column != "created_at" and value is not None
+        }
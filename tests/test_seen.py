@@ -0,0 +1,46 @@
+from rem.seen import SeenListings, listing_id_from_url
+
+URL = "https://www.otodom.pl/pl/oferta/mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i"
+
+
+def test_listing_id_from_url() -> None:
+    assert listing_id_from_url(URL) == "ID4dG6i"
+    assert listing_id_from_url(URL + "?utm_source=x#gallery") == "ID4dG6i"
+    assert listing_id_from_url("mieszkanie-12-min-ID4fRun.html") == "ID4fRun"
+    assert listing_id_from_url("https://www.otodom.pl/pl/oferta/x") is None
+
+
+def test_seen_listings_match_url_or_listing_id() -> None:
+    seen = SeenListings()
+    seen.add(URL)
+    seen.add("sample.com")
+
+    assert URL in seen
+    assert "sample.com" in seen
+    assert "https://www.otodom.pl/pl/oferta/inny-tytul-ID4dG6i" in seen
+    assert "https://www.otodom.pl/pl/oferta/mieszkanie-ID4fRun" not in seen
+    assert "https://www.otodom.pl/pl/oferta/mieszkanie-ID4fRun" not in seen
+    assert len(seen) == 2
+
+
+def test_seen_listings_are_persisted(tmp_path) -> None:
+    path = str(tmp_path / "seen.sqlite")
+    seen = SeenListings(path)
+    seen.add("https://www.otodom.pl/pl/oferta/niezapisane-ID4fRun")
+    seen.save([URL, URL, "sample.com"])
+    seen.close()
+
+    seen = SeenListings(path)
+
+    assert len(seen) == 2
+    assert "https://www.otodom.pl/pl/oferta/inny-tytul-ID4dG6i" in seen
+    assert "https://www.otodom.pl/pl/oferta/mieszkanie-ID4fRun" not in seen
+
+
+def test_unsaved_listings_are_not_persisted(tmp_path) -> None:
+    path = tmp_path / "seen.sqlite"
+    seen = SeenListings(str(path))
+    seen.add_many([URL, "sample.com"])
+    seen.close()
+
+    assert not path.exists()
@@ -0,0 +1,104 @@
+import os
+
+import pandas as pd
+import pytest
+
+import rem.storage
+from rem.sink import DataSink
+from rem.storage import read_data
+
+
+def read_csv(path) -> pd.DataFrame:
+    return pd.read_csv(path, index_col=0)
+
+
+def test_append_writes_only_new_rows(tmp_path) -> None:
+    sink = DataSink(str(tmp_path), "otodom")
+
+    sink.append(pd.DataFrame({"url": ["a", "b"]}))
+    sink.append(pd.DataFrame())
+    sink.append(pd.DataFrame({"url": ["c"], "price": [100]}, index=[2]))
+
+    parts = sink.part_paths()
+    assert [os.path.basename(path) for path in parts] == [
+        "part-00000.csv",
+        "part-00001.csv",
+    ]
+    assert list(read_csv(parts[1])["url"]) == ["c"]
+    assert not os.path.exists(sink.path)
+
+
+def test_compact_replaces_the_parts(tmp_path) -> None:
+    data = pd.DataFrame({"url": ["a", "b"], "price": [100, 200]})
+    sink = DataSink(str(tmp_path), "otodom")
+    sink.append(data.iloc[:1])
+    sink.append(data.iloc[1:])
+
+    sink.compact(data)
+
+    pd.testing.assert_frame_equal(read_csv(sink.path), data)
+    assert sink.part_paths() == []
+    assert sorted(os.listdir(tmp_path)) == ["otodom.csv"]
+
+
+def test_compact_merges_the_parts(tmp_path) -> None:
+    sink = DataSink(str(tmp_path), "otodom")
+    sink.compact(pd.DataFrame({"url": ["a"]}))
+    sink.append(pd.DataFrame({"url": ["b"]}))
+    sink.append(pd.DataFrame({"url": ["c"]}))
+
+    sink.compact(parts_only=True)
+
+    assert list(read_csv(sink.path)["url"]) == ["b", "c"]
+    sink.append(pd.DataFrame({"url": ["d"]}))
+    sink.compact()
+    assert list(read_csv(sink.path)["url"]) == ["b", "c", "d"]
+
+
+def test_recover_merges_parts_left_behind(tmp_path) -> None:
+    sink = DataSink(str(tmp_path), "otodom")
+    sink.compact(pd.DataFrame({"url": ["a"]}))
+    sink.append(pd.DataFrame({"url": ["b"], "price": [200]}, index=[1]))
+    # A part that was being written when the scrape was interrupted
+    with open(os.sep.join([sink.parts_directory, "part-00001.csv.tmp"]), "w"):
+        pass
+
+    DataSink(str(tmp_path), "otodom").recover()
+
+    data = read_csv(sink.path)
+    assert list(data["url"]) == ["a", "b"]
+    assert data["price"].isna().tolist() == [True, False]
+    assert sorted(os.listdir(tmp_path)) == ["otodom.csv"]
+
+
+def test_recover_finishes_interrupted_compaction(tmp_path) -> None:
+    sink = DataSink(str(tmp_path), "otodom")
+    sink.compact(pd.DataFrame({"url": ["a"]}))
+    sink.append(pd.DataFrame({"url": ["b"]}, index=[1]))
+    # Interrupted after the parts were set aside, the merged data is written
+    pd.DataFrame({"url": ["a", "b"]}).to_csv(f"{sink.path}.tmp")
+    os.replace(sink.parts_directory, sink.compacted_parts_directory)
+
+    sink.recover()
+
+    assert list(read_csv(sink.path)["url"]) == ["a", "b"]
+    assert sorted(os.listdir(tmp_path)) == ["otodom.csv"]
+
+
+@pytest.mark.skipif(
+    rem.storage.pyarrow is None, reason="pyarrow is not installed"
+)
+def test_parquet_parts(tmp_path) -> None:
+    sink = DataSink(str(tmp_path), "otodom", "parquet")
+    sink.compact(pd.DataFrame({"url": ["a"], "price": [100]}))
+    sink.append(pd.DataFrame({"url": ["b"], "price": [None]}, index=[1]))
+
+    assert [os.path.basename(path) for path in sink.part_paths()] == [
+        "part-00000.parquet"
+    ]
+    sink.recover()
+
+    data = read_data(sink.path, "parquet")
+    assert list(data["url"]) == ["a", "b"]
+    assert data["price"].dtype == float
+    assert sorted(os.listdir(tmp_path)) == ["otodom.parquet"]
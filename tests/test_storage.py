@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+import rem.storage
+from rem.storage import (
+    data_file_path,
+    merge_data,
+    read_data,
+    resolve_data_format,
+    write_data,
+)
+
+DATA_FORMATS = [
+    "csv",
+    pytest.param(
+        "parquet",
+        marks=pytest.mark.skipif(
+            rem.storage.pyarrow is None, reason="pyarrow is not installed"
+        ),
+    ),
+]
+
+
+@pytest.fixture
+def data() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "url": ["https://www.otodom.pl/pl/oferta/a-ID4dG6i", None],
+            "price": [1500000, 1782636],
+            "monthly_fee": [800.0, float("nan")],
+            "ad_description": ["Gratka dla fanów kamienic!", "Doskonała"],
+        }
+    )
+
+
+@pytest.mark.parametrize("data_format", DATA_FORMATS)
+def test_data_round_trip(tmp_path, data, data_format) -> None:
+    path = data_file_path(str(tmp_path), "otodom", data_format)
+
+    write_data(data, path, data_format)
+
+    assert path.endswith(f"otodom.{data_format}")
+    loaded = read_data(path, data_format)
+    assert list(loaded.columns) == list(data.columns)
+    assert loaded["price"].tolist() == data["price"].tolist()
+    assert loaded["monthly_fee"].dtype == float
+    assert pd.isna(loaded.loc[1, "url"])
+
+
+@pytest.mark.parametrize("data_format", DATA_FORMATS)
+def test_read_data_projects_columns(tmp_path, data, data_format) -> None:
+    path = data_file_path(str(tmp_path), "otodom", data_format)
+    write_data(data, path, data_format)
+
+    loaded = read_data(path, data_format, columns=["url", "unique_id"])
+
+    assert list(loaded.columns) == ["url"]
+    assert len(loaded) == 2
+
+
+@pytest.mark.skipif(
+    rem.storage.pyarrow is None, reason="pyarrow is not installed"
+)
+def test_parquet_columns_have_declared_types(tmp_path, data) -> None:
+    path = data_file_path(str(tmp_path), "otodom", "parquet")
+    data["unique_id"] = [62553565.0, float("nan")]
+    # A batch of rows without a single price or address
+    data["address"] = data["price"] = None
+    data["extra"] = [1, 2]
+
+    write_data(data, path, "parquet")
+
+    schema = rem.storage.pyarrow.parquet.read_schema(path)
+    assert schema.field("price").type == "double"
+    assert schema.field("unique_id").type == "int64"
+    assert schema.field("url").type == "string"
+    assert schema.field("address").type == "string"
+    assert schema.field("extra").type == "int64"
+    loaded = read_data(path, "parquet")
+    assert loaded["price"].dtype == float
+    assert loaded["unique_id"].tolist()[0] == 62553565
+
+
+@pytest.mark.parametrize("data_format", DATA_FORMATS)
+def test_merge_data_a_chunk_at_a_time(tmp_path, data, data_format) -> None:
+    paths = [
+        data_file_path(str(tmp_path), name, data_format)
+        for name in ("data", "part-00000")
+    ]
+    write_data(data, paths[0], data_format)
+    write_data(
+        pd.DataFrame({"url": ["c"], "address": ["Warszawa"]}, index=[5]),
+        paths[1],
+        data_format,
+    )
+    path = data_file_path(str(tmp_path), "merged", data_format)
+
+    merge_data(paths, path, data_format, chunk_size=1)
+
+    merged = read_data(path, data_format)
+    assert list(merged.columns) == list(data.columns) + ["address"]
+    assert list(merged.index) == [0, 1, 2]
+    assert merged["url"].tolist()[2] == "c"
+    assert merged["price"].tolist()[:2] == [1500000, 1782636]
+    assert pd.isna(merged.loc[2, "price"])
+    assert merged.loc[2, "address"] == "Warszawa"
+
+
+def test_resolve_data_format(monkeypatch) -> None:
+    assert resolve_data_format("csv") == "csv"
+    with pytest.raises(ValueError):
+        resolve_data_format("xlsx")
+
+    monkeypatch.setattr(rem.storage, "pyarrow", None)
+    assert resolve_data_format("parquet") == "csv"
@@ -0,0 +1,140 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from rem.store import ListingStore
+from rem.utils import load_data, save_data
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ListingStore(str(tmp_path / "otodom.sqlite"))
+    yield store
+    store.close()
+
+
+def test_upsert_updates_listings_by_unique_id(store) -> None:
+    store.upsert(
+        pd.DataFrame(
+            {"unique_id": [1.0, 2.0], "url": ["a", "b"], "price": [100, 200]}
+        )
+    )
+    store.upsert(
+        pd.DataFrame(
+            {"unique_id": [2, 3], "url": ["b", "c"], "price": [250, 300]}
+        )
+    )
+
+    data = store.read()
+
+    assert len(store) == 3
+    assert list(data["unique_id"]) == [1, 2, 3]
+    assert list(data["price"]) == [100, 250, 300]
+    assert store.get(2)["price"] == 250
+    assert store.get(4) is None
+
+
+def test_listings_without_unique_id_are_always_added(store) -> None:
+    rows = pd.DataFrame({"unique_id": [None, None], "url": ["a", "a"]})
+    store.upsert(rows)
+    store.upsert(rows[["url"]])
+
+    assert len(store) == 4
+
+
+def test_columns_have_declared_types(store) -> None:
+    # A first batch without a single price or address
+    store.upsert(
+        pd.DataFrame({"unique_id": [1], "price": [None], "address": [None]})
+    )
+    store.upsert(
+        pd.DataFrame({"unique_id": [2], "price": [100.5], "address": ["W"]})
+    )
+
+    types = dict(
+        store.query("PRAGMA table_info(listings)")[["name", "type"]].values
+    )
+    data = store.read(["price", "address"])
+
+    assert types["unique_id"] == "INTEGER"
+    assert types["price"] == "REAL"
+    assert types["address"] == "TEXT"
+    assert types["distance_to center"] == "TEXT"
+    assert data["price"].dtype == float
+    assert data["address"].tolist() == [None, "W"]
+
+
+def test_new_columns_are_added(store) -> None:
+    store.upsert(pd.DataFrame({"unique_id": [1], "url": ["a"]}))
+    store.upsert(pd.DataFrame({"unique_id": [2], "noise_level": [1.5]}))
+
+    data = store.read(["url", "noise_level", "missing"])
+
+    assert list(data.columns) == ["url", "noise_level"]
+    assert data["url"][0] == "a"
+    assert pd.isna(data["noise_level"][0])
+    assert data["noise_level"][1] == 1.5
+
+
+def test_older_stores_get_the_declared_columns(tmp_path) -> None:
+    path = str(tmp_path / "otodom.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE listings (unique_id INTEGER, url TEXT)")
+    db.execute("INSERT INTO listings VALUES (1, 'a')")
+    db.commit()
+    db.close()
+
+    store = ListingStore(path)
+    data = store.read()
+    store.close()
+
+    assert list(data.columns[:2]) == ["unique_id", "url"]
+    assert "price" in data.columns
+    assert data["url"].tolist() == ["a"]
+
+
+def test_store_is_indexed_and_in_wal_mode(store) -> None:
+    store.upsert(
+        pd.DataFrame(
+            {
+                "unique_id": [1],
+                "created_at": ["2022-09-01"],
+                "url": ["a"],
+                "price": [100],
+                "floor": [1],
+            }
+        )
+    )
+
+    indexes = set(
+        store.query("SELECT name FROM sqlite_master WHERE type='index'")[
+            "name"
+        ]
+    )
+    journal_mode = store.query("PRAGMA journal_mode")["journal_mode"][0]
+
+    assert indexes == {
+        "listings_unique_id",
+        "listings_created_at",
+        "listings_url",
+        "listings_price",
+    }
+    assert journal_mode == "wal"
+
+
+def test_load_data_from_store(tmp_path) -> None:
+    data = pd.DataFrame(
+        {"unique_id": [1, 2], "url": ["a", "b"], "price": [100.0, None]}
+    )
+    save_data(data, "otodom", str(tmp_path), data_format="sqlite")
+    save_data(data.iloc[1:], "otodom", str(tmp_path), data_format="sqlite")
+
+    loaded = load_data("otodom", str(tmp_path), data_format="sqlite")
+    urls = load_data(
+        "otodom", str(tmp_path), columns=["url"], data_format="sqlite"
+    )
+
+    pd.testing.assert_frame_equal(loaded[data.columns], data)
+    assert list(urls.columns) == ["url"]
+    assert load_data("missing", str(tmp_path), data_format="sqlite").empty
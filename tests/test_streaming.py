@@ -0,0 +1,96 @@
+import pytest
+from conftest import read_resource
+
+import rem.utils
+from rem.streaming import parse_listing
+
+# Quirks BeautifulSoup keeps in the tree: comments and whitespace between
+# tags, unclosed and stray end tags, empty-element tags and script text.
+EDGE_CASES_HTML = """
+<html><head>
+<link rel="stylesheet canonical" href="https://www.otodom.pl/pl/oferta/x">
+<meta content="https://www.otodom.pl/pl/oferta/x-ID12345678">
+<meta content="nothing">
+</head><body>
+<strong aria-label="Cena">1 250 000 zł</strong>
+<div aria-label="Powierzchnia"><div title="Powierzchnia">Powierzchnia</div><div title="45,5 m²">45,5 m²</div></div>
+<div aria-label="Liczba pokoi">
+  <div title="Liczba pokoi">Liczba pokoi</div>
+  <div title="2">2</div>
+</div>
+<div aria-label="Piętro"><div title="Piętro">Piętro</div><div title="parter">parter<!-- c --></div></div>
+<div aria-label="Rynek"><div title="Rynek">Rynek</div><div title="x">wtórny</div></div>
+<div aria-label="Rynek"><div title="Rynek">Rynek</div></div>
+<div aria-label="Czynsz"><div title="Czynsz">Czynsz</div><div title="x">650,40 zł<br>miesięcznie<!-- c --></div></div>
+<a href="#">ul. Marszałkowska, <b>Śródmieście</b>, Warszawa</a>
+<a href="#">Warszawa<script>var a = "Warszawa, ul. Długa 1";</script></a>
+<div data-cy="adPageAdDescription"><p>Opis <b>mieszkania</b><p>&amp; dalej &lt;3</div></span>
+<section><h3>Media</h3><ul><li>internet</li><li>domofon / wideofon</li></ul></section>
+<section><ul><li>przed nagłówkiem</li></ul><h3>Informacje</h3><div><ul><li>zagnieżdżona</li></ul></div>
+<ul><li>balkon<ul><li>taras</li></ul></li><li>garaż/miejsce parkingowe</li></ul></section>
+<img src="x.png"></img>
+</body></html>
+"""
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        read_resource("mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i.html"),
+        read_resource("mieszkanie-12-min-do-centrum.html"),
+        EDGE_CASES_HTML,
+    ],
+    ids=["listing", "alternative_listing", "edge_cases"],
+)
+def test_streamed_listing_gives_the_same_record(scraper, html) -> None:
+    expected = scraper.get_data_from_listing(rem.utils.get_soup(html))
+    listing_data = scraper.get_data_from_listing(parse_listing(html))
+
+    del listing_data["created_at"], expected["created_at"]
+    assert listing_data == pytest.approx(expected, nan_ok=True)
+
+
+def test_streamed_listing_edge_cases(scraper) -> None:
+    listing = parse_listing(EDGE_CASES_HTML)
+
+    assert scraper.get_listing_url(listing) == {
+        "url": "https://www.otodom.pl/pl/oferta/x"
+    }
+    assert scraper.get_price(listing) == {"price": 1250000}
+    # Whitespace between the tags is a child as well, as with a soup
+    with pytest.raises(AttributeError):
+        scraper.get_number_of_rooms(listing)
+    assert scraper.get_floor(listing) == {
+        "floor": 0,
+        "floors_in_building": None,
+    }
+    assert scraper.get_monthly_fee(listing) == {"monthly_fee": 650.0}
+    assert scraper.get_market_type(listing) == {"market_type": None}
+    assert scraper.get_unique_id(listing) == {"unique_id": 12345678}
+    assert scraper.get_address(listing) == {
+        "address": "ul. Marszałkowska, Śródmieście, Warszawa"
+    }
+    assert scraper.get_ad_description(listing) == {
+        "ad_description": "Opis mieszkania& dalej <3"
+    }
+    assert scraper.resolve_additional_features(listing) == {
+        "internet",
+        "domofon / wideofon",
+        "domofon",
+        "wideofon",
+        "balkontaras",
+        "taras",
+        "garaż/miejsce parkingowe",
+        "garaż",
+        "miejsce parkingowe",
+    }
+
+
+def test_scraper_uses_streaming_extraction(scraper, monkeypatch) -> None:
+    html = read_resource("mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i.html")
+
+    monkeypatch.setattr(scraper, "streaming_extraction", True)
+    listing = scraper.parse_listing(html)
+
+    assert rem.utils.get_listing_index(listing) is listing
+    assert scraper.get_data_from_listing(listing)["price"] == 1500000
@@ -28,3 +28,46 @@ def test_save_data() -> None:
     assert data.test[0] == 1
     assert data.test[1] == 2
     assert data.test[2] == 3
+
+
+def test_is_search_url() -> None:
+    assert utils.is_search_url(
+        "https://www.otodom.pl/pl/oferty/sprzedaz/mieszkanie/warszawa?page=1"
+    )
+    assert not utils.is_search_url(
+        "https://www.otodom.pl/pl/oferta/mieszkanie-ID4dG6i.html"
+    )
+
+
+def test_resolve_html_parser() -> None:
+    assert utils.resolve_html_parser("html.parser") == "html.parser"
+    assert utils.resolve_html_parser("not-a-parser") == "html.parser"
+
+
+def test_listing_index() -> None:
+    path = os.sep.join(
+        [
+            "tests",
+            "resources",
+            "mieszkanie-w-kamienicy-w-srodmiesciu-ID4dG6i.html",
+        ]
+    )
+    with open(path, encoding="utf-8") as fp:
+        soup = utils.get_soup(fp)
+
+    index = utils.get_listing_index(soup)
+
+    assert utils.get_listing_index(soup) is index
+    assert index.find_all("meta") == soup.find_all("meta")
+    assert index.find_all("h3") == soup.find_all("h3")
+    assert index.find_all("not-a-tag") == []
+    assert index.find_all_by_attribute("aria-label", "Cena") == soup.find_all(
+        attrs={"aria-label": "Cena"}
+    )
+    assert index.find_all_by_attribute(
+        "data-cy", "adPageAdDescription"
+    ) == soup.find_all(attrs={"data-cy": "adPageAdDescription"})
+    assert (
+        index.canonical_url()
+        == soup.select('link[rel="canonical"]')[0]["href"]
+    )